@@ -1,12 +1,25 @@
+import itertools
+import os
 import numpy as np
 import pandas as pd
 import random
+import warnings
 from scipy import stats
+from scipy.stats import qmc
+
+from election_data import (
+    election_years,
+    lookup_results,
+    read_election_csv,
+    year_results,
+)
+from instrumentation import count, instrumented, stage
 
 
 # Load data and constants
+@instrumented("load_data_and_constants")
 def load_data_and_constants():
-    historical_data = pd.read_csv("bangladesh_elections_data.csv")
+    historical_data = read_election_csv("bangladesh_elections_data.csv")
 
     constants = {
         "population_size": 1000,
@@ -155,12 +168,16 @@ def define_demographic_probabilities():
 
 # Get party probabilities based on historical data
 def get_party_probabilities(historical_data, year, parties):
-    year_data = historical_data[historical_data["Year"] == year]
-    probabilities = year_data.set_index("Party")["Vote Share (%)"] / 100
-    return {party: probabilities.get(party, 0.01) for party in parties.keys()}
+    shares = lookup_results(historical_data, year, parties)
+    return {
+        party: 0.01 if np.isnan(share) else share / 100
+        for party, share in zip(parties, shares)
+    }
 
 
-# Simulate an individual
+# Simulate an individual; callers simulating many voters should compile the
+# affiliation table and demographic sampler once and pass them in, as
+# run_simulation does, instead of having every call rebuild them
 def simulate_individual(
     year,
     constants,
@@ -168,41 +185,40 @@ def simulate_individual(
     political_spectrums,
     demographic_probabilities,
     historical_data,
+    affiliation_table=None,
+    demographic_sampler=None,
 ):
-    individual = {
-        "religion": random.choices(
-            list(constants["religion_distribution"].keys()),
-            weights=constants["religion_distribution"].values(),
-        )[0],
-        "age_group": random.choices(
-            list(constants["age_distribution"].keys()),
-            weights=constants["age_distribution"].values(),
-        )[0],
-        "gender": random.choices(
-            list(constants["gender_distribution"].keys()),
-            weights=constants["gender_distribution"].values(),
-        )[0],
-        "literacy": random.choices(
-            list(constants["literacy_rate"].keys()),
-            weights=constants["literacy_rate"].values(),
-        )[0],
-        "location": random.choices(
-            list(constants["urban_rural_distribution"].keys()),
-            weights=constants["urban_rural_distribution"].values(),
-        )[0],
-        "education": random.choices(
-            list(constants["education_distribution"].keys()),
-            weights=constants["education_distribution"].values(),
-        )[0],
-    }
+    if demographic_sampler is None:
+        demographic_sampler = compile_demographic_sampler(constants)
+    # Each draw is a lookup in a precomputed cumulative row, picked by the
+    # code of the column it is conditioned on
+    codes = {}
+    individual = {}
+    for column, labels, given, cumulative_rows in demographic_sampler:
+        row = cumulative_rows[0 if given is None else codes[given]]
+        codes[column] = random.choices(range(len(labels)), cum_weights=row)[0]
+        individual[column] = labels[codes[column]]
 
+    spectrum_labels = list(political_spectrums)
     spectrum_probs = [
         political_spectrums[spectrum][individual["age_group"]]
-        for spectrum in political_spectrums
+        for spectrum in spectrum_labels
     ]
-    individual["political_spectrum"] = random.choices(
-        list(political_spectrums.keys()), weights=spectrum_probs
+    codes["political_spectrum"] = random.choices(
+        range(len(spectrum_labels)), weights=spectrum_probs
     )[0]
+    individual["political_spectrum"] = spectrum_labels[codes["political_spectrum"]]
+
+    if affiliation_table is not None:
+        individual["political_affiliation"] = random.choices(
+            list(parties.keys()),
+            weights=affiliation_table[
+                codes["religion"],
+                codes["education"],
+                codes["political_spectrum"],
+            ],
+        )[0]
+        return individual
 
     base_probabilities = get_party_probabilities(historical_data, year, parties)
     adjusted_probabilities = base_probabilities.copy()
@@ -232,6 +248,7 @@ def simulate_individual(
 
 
 # Run simulation
+@instrumented("run_simulation")
 def run_simulation(
     num_simulations,
     year,
@@ -241,8 +258,542 @@ def run_simulation(
     demographic_probabilities,
     historical_data,
 ):
-    individuals = [
-        simulate_individual(
+    affiliation_table = compile_affiliation_table(
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+    )
+    categories = define_categories(constants, parties, political_spectrums)
+    demographic_sampler = compile_demographic_sampler(constants)
+    category_codes = {
+        column: {label: code for code, label in enumerate(labels)}
+        for column, labels in categories.items()
+    }
+    population = {
+        column: np.empty(num_simulations, dtype=np.uint8) for column in categories
+    }
+    with stage("simulate_individual"):
+        for i in range(num_simulations):
+            individual = simulate_individual(
+                year,
+                constants,
+                parties,
+                political_spectrums,
+                demographic_probabilities,
+                historical_data,
+                affiliation_table,
+                demographic_sampler,
+            )
+            for column, value in individual.items():
+                population[column][i] = category_codes[column][value]
+        count("voters", num_simulations)
+        count("rng_draws", num_simulations * len(categories))
+    return population_to_frame(population, categories)
+
+
+# Population columns drawn directly from the demographic distributions
+DEMOGRAPHIC_DISTRIBUTIONS = {
+    "religion": "religion_distribution",
+    "age_group": "age_distribution",
+    "gender": "gender_distribution",
+    "literacy": "literacy_rate",
+    "location": "urban_rural_distribution",
+    "education": "education_distribution",
+}
+
+
+# Category labels for every integer-coded population column
+def define_categories(constants, parties, political_spectrums):
+    categories = {
+        column: list(constants[key].keys())
+        for column, key in DEMOGRAPHIC_DISTRIBUTIONS.items()
+    }
+    categories["political_spectrum"] = list(political_spectrums.keys())
+    categories["political_affiliation"] = list(parties.keys())
+    return categories
+
+
+# Conditional tables from constants["conditional_distributions"], e.g.
+# {"education": {"given": "location", "table": [[...], [...]]}} where the table
+# is indexed by [given category, column category]; rows are normalized
+def conditional_distributions(constants):
+    conditionals = {}
+    for column, spec in constants.get("conditional_distributions", {}).items():
+        given = spec["given"]
+        if column not in DEMOGRAPHIC_DISTRIBUTIONS or given not in (
+            DEMOGRAPHIC_DISTRIBUTIONS
+        ):
+            raise ValueError(f"Unknown conditional distribution: {column} | {given}")
+        table = np.asarray(spec["table"], dtype=float)
+        shape = (
+            len(constants[DEMOGRAPHIC_DISTRIBUTIONS[given]]),
+            len(constants[DEMOGRAPHIC_DISTRIBUTIONS[column]]),
+        )
+        if table.shape != shape:
+            raise ValueError(
+                f"Table of {column} | {given} has shape {table.shape}, expected {shape}"
+            )
+        if (table < 0).any() or (table.sum(axis=1) <= 0).any():
+            raise ValueError(f"Table of {column} | {given} has invalid weights")
+        conditionals[column] = (given, _normalized_weights(table))
+    return conditionals
+
+
+# Order to draw the demographic columns in, so every conditioned column
+# comes after the column it depends on
+def demographic_draw_order(conditionals):
+    if not conditionals:
+        return list(DEMOGRAPHIC_DISTRIBUTIONS)
+    order = []
+    remaining = list(DEMOGRAPHIC_DISTRIBUTIONS)
+    while remaining:
+        ready = [
+            column
+            for column in remaining
+            if column not in conditionals or conditionals[column][0] in order
+        ]
+        if not ready:
+            raise ValueError(f"Conditional distributions form a cycle: {remaining}")
+        order.append(ready[0])
+        remaining.remove(ready[0])
+    return order
+
+
+# Precompute the cumulative weight rows of every demographic column for the
+# per-voter engine, as (column, labels, given column, rows) in draw order
+def compile_demographic_sampler(constants):
+    conditionals = conditional_distributions(constants)
+    sampler = []
+    for column in demographic_draw_order(conditionals):
+        distribution = constants[DEMOGRAPHIC_DISTRIBUTIONS[column]]
+        if column in conditionals:
+            given, table = conditionals[column]
+            rows = np.cumsum(table, axis=1).tolist()
+        else:
+            given, rows = None, [list(itertools.accumulate(distribution.values()))]
+        sampler.append((column, list(distribution), given, rows))
+    return sampler
+
+
+# Joint probability of every demographic cell, with one axis per column in
+# DEMOGRAPHIC_DISTRIBUTIONS order, built from the marginal and conditional tables
+def demographic_joint_probabilities(constants):
+    conditionals = conditional_distributions(constants)
+    columns = list(DEMOGRAPHIC_DISTRIBUTIONS)
+    joint = np.ones([1] * len(columns))
+    for column in demographic_draw_order(conditionals):
+        shape = [1] * len(columns)
+        shape[columns.index(column)] = -1
+        if column in conditionals:
+            given, table = conditionals[column]
+            shape[columns.index(given)] = table.shape[0]
+            # reshape fills the axes in order, so the table's axes must match
+            if columns.index(given) > columns.index(column):
+                table = table.T
+        else:
+            table = _normalized_weights(
+                list(constants[DEMOGRAPHIC_DISTRIBUTIONS[column]].values())
+            )
+        joint = joint * table.reshape(shape)
+    return joint
+
+
+# The [religion, age_group, education] cells that affiliation depends on,
+# summed out of a joint demographic array of probabilities or counts
+def affiliation_cells(joint):
+    columns = list(DEMOGRAPHIC_DISTRIBUTIONS)
+    return np.moveaxis(
+        joint,
+        [columns.index(column) for column in ["religion", "age_group", "education"]],
+        [0, 1, 2],
+    ).sum(axis=tuple(range(3, len(columns))))
+
+
+# Normalized cumulative weights along the last axis
+def _cumulative_weights(weights):
+    cumulative = np.cumsum(np.asarray(weights, dtype=float), axis=-1)
+    return cumulative / cumulative[..., -1:]
+
+
+# How the vectorized engine generates the uniforms behind its inverse-CDF
+# draws; every method gives unbiased shares, the last three with less noise
+SAMPLING_METHODS = ["random", "antithetic", "sobol", "stratified"]
+
+# Draws of the vectorized engine, one Sobol dimension each
+SAMPLING_DIMENSIONS = list(DEMOGRAPHIC_DISTRIBUTIONS) + [
+    "political_spectrum",
+    "political_affiliation",
+]
+
+# Sobol points generated per block; a power of two keeps each block balanced
+SOBOL_BLOCK_SIZE = 2**16
+
+
+# Uniforms stratified within every stratum: a stratum of m voters gets one
+# uniform in each interval [k/m, (k+1)/m), assigned to its voters at random
+def _stratified_uniforms(rng, strata):
+    num_simulations = len(strata)
+    order = rng.permutation(num_simulations)
+    keys = strata[order]
+    # Stable sorts of 16-bit keys are radix sorts
+    if num_simulations and keys.max() < 2**16:
+        keys = keys.astype(np.uint16)
+    order = order[np.argsort(keys, kind="stable")]
+    sorted_strata = strata[order]
+    starts = np.flatnonzero(np.r_[True, sorted_strata[1:] != sorted_strata[:-1]])
+    sizes = np.diff(np.r_[starts, num_simulations])
+    ranks = np.arange(num_simulations) - np.repeat(starts, sizes)
+    uniforms = np.empty(num_simulations)
+    uniforms[order] = (ranks + rng.random(num_simulations)) / np.repeat(sizes, sizes)
+    return uniforms
+
+
+# Source of the uniforms for every draw of the vectorized engine, as a
+# function of the draw's name and the stratum of every voter:
+# - random: independent uniforms
+# - antithetic: the second half of the voters mirror the first, u and 1 - u
+# - sobol: a scrambled Sobol point per voter, one dimension per draw; balance
+#   is best when num_simulations is a power of two
+# - stratified: uniforms stratified within the demographic cell drawn so far,
+#   so every cell gets close to its proportional share of voters
+def uniform_sampler(num_simulations, sampling="random", rng=None):
+    rng = np.random.default_rng(rng)
+    if sampling == "random":
+        return lambda dimension, strata: rng.random(num_simulations)
+    if sampling == "antithetic":
+
+        def antithetic(dimension, strata):
+            half = rng.random(-(-num_simulations // 2))
+            return np.concatenate([half, 1 - half])[:num_simulations]
+
+        return antithetic
+    if sampling == "sobol":
+        engine = qmc.Sobol(len(SAMPLING_DIMENSIONS), seed=rng)
+        return lambda dimension, strata: _sobol_column(
+            engine, SAMPLING_DIMENSIONS.index(dimension), num_simulations
+        )
+    if sampling == "stratified":
+        return lambda dimension, strata: _stratified_uniforms(rng, strata)
+    raise ValueError(f"Unknown sampling method: {sampling}")
+
+
+# Regenerate the first num_simulations Sobol points block by block, keeping one column
+def _sobol_column(engine, column, num_simulations):
+    engine.reset()
+    uniforms = np.empty(num_simulations)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        for start in range(0, num_simulations, SOBOL_BLOCK_SIZE):
+            stop = min(start + SOBOL_BLOCK_SIZE, num_simulations)
+            uniforms[start:stop] = engine.random(stop - start)[:, column]
+    return uniforms
+
+
+# Draw category codes from a single cumulative distribution
+def _draw_codes(uniforms, cumulative):
+    codes = np.searchsorted(cumulative, uniforms, side="right")
+    return np.minimum(codes, len(cumulative) - 1).astype(np.uint8)
+
+
+# Draw category codes where each voter uses the cumulative row given by rows
+def _draw_conditional_codes(uniforms, cumulative, rows):
+    num_rows, num_categories = cumulative.shape
+    rows = np.asarray(rows, dtype=np.int64)
+    offsets = np.arange(num_rows, dtype=float)
+    flat = (cumulative + offsets[:, None]).ravel()
+    uniforms = uniforms + offsets[rows]
+    codes = np.searchsorted(flat, uniforms, side="right") - rows * num_categories
+    return np.minimum(codes, num_categories - 1).astype(np.uint8)
+
+
+# Age-conditioned spectrum weights as an [age_group, spectrum] array
+def _spectrum_weights(categories, political_spectrums):
+    return np.array(
+        [
+            [political_spectrums[spectrum][age] for spectrum in political_spectrums]
+            for age in categories["age_group"]
+        ]
+    )
+
+
+# Religion and education factors as arrays indexed by [party, category]
+def _demographic_factor_arrays(categories, demographic_probabilities):
+    return tuple(
+        np.array(
+            [
+                [
+                    demographic_probabilities[factor].get(party, {}).get(value, 1.0)
+                    for value in categories[factor]
+                ]
+                for party in categories["political_affiliation"]
+            ]
+        )
+        for factor in ["religion", "education"]
+    )
+
+
+# Spectrum match multipliers as an array indexed by [party, spectrum]
+def _spectrum_multipliers(categories, parties):
+    party_names = categories["political_affiliation"]
+    spectrum_multipliers = np.ones(
+        (len(party_names), len(categories["political_spectrum"]))
+    )
+    for i, party in enumerate(party_names):
+        for j, spectrum in enumerate(categories["political_spectrum"]):
+            if parties[party] == spectrum:
+                spectrum_multipliers[i, j] = 1.5
+            elif parties[party] in ["Various", "Populism"]:
+                spectrum_multipliers[i, j] = 1.2
+    return spectrum_multipliers
+
+
+# Party weight factors as arrays indexed by [party, category]
+def _party_factor_arrays(
+    year, categories, parties, demographic_probabilities, historical_data
+):
+    base_probabilities = get_party_probabilities(historical_data, year, parties)
+    base = np.array(
+        [base_probabilities[party] for party in categories["political_affiliation"]]
+    )
+    religion_factors, education_factors = _demographic_factor_arrays(
+        categories, demographic_probabilities
+    )
+    spectrum_multipliers = _spectrum_multipliers(categories, parties)
+    return base, religion_factors, education_factors, spectrum_multipliers
+
+
+# Precompute P(party | religion, education, spectrum) for one election year
+@instrumented("compile_affiliation_table")
+def compile_affiliation_table(
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+):
+    categories = define_categories(constants, parties, political_spectrums)
+    base, religion_factors, education_factors, spectrum_multipliers = (
+        _party_factor_arrays(
+            year, categories, parties, demographic_probabilities, historical_data
+        )
+    )
+    table = (
+        base
+        * religion_factors.T[:, None, None, :]
+        * education_factors.T[None, :, None, :]
+        * spectrum_multipliers.T[None, None, :, :]
+    )
+    return table / table.sum(axis=-1, keepdims=True)
+
+
+# Draw the year-independent demographic and spectrum codes for a population;
+# sampler gives the uniforms behind every draw, see uniform_sampler
+def simulate_demographics(
+    num_simulations, constants, parties, political_spectrums, rng=None, sampler=None
+):
+    if sampler is None:
+        sampler = uniform_sampler(num_simulations, rng=rng)
+    categories = define_categories(constants, parties, political_spectrums)
+
+    # Stratum of every voter: its cell of the columns drawn so far that other
+    # draws depend on, small enough to hold many voters even in small runs
+    strata = np.zeros(num_simulations, dtype=np.int64)
+    conditionals = conditional_distributions(constants)
+    strata_columns = {"religion", "age_group", "education"} | {
+        given for given, _ in conditionals.values()
+    }
+    population = {}
+    for column in demographic_draw_order(conditionals):
+        uniforms = sampler(column, strata)
+        if column in conditionals:
+            given, table = conditionals[column]
+            population[column] = _draw_conditional_codes(
+                uniforms, _cumulative_weights(table), population[given]
+            )
+        else:
+            population[column] = _draw_codes(
+                uniforms,
+                _cumulative_weights(
+                    list(constants[DEMOGRAPHIC_DISTRIBUTIONS[column]].values())
+                ),
+            )
+        if column in strata_columns:
+            strata = strata * len(categories[column]) + population[column]
+    population = {column: population[column] for column in DEMOGRAPHIC_DISTRIBUTIONS}
+
+    population["political_spectrum"] = _draw_conditional_codes(
+        sampler("political_spectrum", strata),
+        _cumulative_weights(_spectrum_weights(categories, political_spectrums)),
+        population["age_group"],
+    )
+
+    return population
+
+
+# Draw party affiliation codes for a population from a compiled affiliation table
+def draw_affiliations(population, affiliation_table, rng=None, sampler=None):
+    num_educations, num_spectrums, num_parties = affiliation_table.shape[1:]
+    cells = (
+        population["religion"].astype(np.int64) * num_educations
+        + population["education"]
+    ) * num_spectrums + population["political_spectrum"]
+    if sampler is None:
+        sampler = uniform_sampler(len(cells), rng=rng)
+    return _draw_conditional_codes(
+        sampler("political_affiliation", cells),
+        _cumulative_weights(affiliation_table.reshape(-1, num_parties)),
+        cells,
+    )
+
+
+# Simulate a whole population at once as integer-coded NumPy arrays
+@instrumented("simulate_population")
+def simulate_population(
+    num_simulations,
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    rng=None,
+    affiliation_table=None,
+    sampling="random",
+):
+    sampler = uniform_sampler(num_simulations, sampling, rng)
+    population = simulate_demographics(
+        num_simulations, constants, parties, political_spectrums, sampler=sampler
+    )
+
+    if affiliation_table is None:
+        affiliation_table = compile_affiliation_table(
+            year,
+            constants,
+            parties,
+            political_spectrums,
+            demographic_probabilities,
+            historical_data,
+        )
+    population["political_affiliation"] = draw_affiliations(
+        population, affiliation_table, sampler=sampler
+    )
+    count("voters", num_simulations)
+    count("rng_draws", num_simulations * len(population))
+
+    return population
+
+
+# Weights normalized to probabilities along the last axis
+def _normalized_weights(weights):
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum(axis=-1, keepdims=True)
+
+
+# Draw counts for a distribution, using a binomial split for two categories
+def _draw_category_counts(rng, total, probabilities):
+    if len(probabilities) == 2:
+        first = rng.binomial(total, probabilities[0])
+        return np.array([first, total - first])
+    return rng.multinomial(total, probabilities)
+
+
+# Draw year-independent counts per religion x age group x education x spectrum cell
+def simulate_demographic_counts(
+    num_simulations, constants, parties, political_spectrums, rng=None
+):
+    rng = np.random.default_rng(rng)
+    categories = define_categories(constants, parties, political_spectrums)
+    spectrum_weights = _normalized_weights(
+        _spectrum_weights(categories, political_spectrums)
+    )
+
+    # With conditional tables the attributes are not independent, so draw
+    # the joint demographic cells in one multinomial; spectrum only depends
+    # on age group and is drawn per religion x age group x education cell
+    if conditional_distributions(constants):
+        columns = list(DEMOGRAPHIC_DISTRIBUTIONS)
+        joint = demographic_joint_probabilities(constants)
+        joint_counts = rng.multinomial(num_simulations, joint.ravel()).reshape(
+            joint.shape
+        )
+        counts = {
+            column: joint_counts.sum(
+                axis=tuple(axis for axis in range(len(columns)) if axis != i)
+            )
+            for i, column in enumerate(columns)
+        }
+        cell_counts = affiliation_cells(joint_counts)
+        spectrum_counts = rng.multinomial(
+            cell_counts, spectrum_weights[None, :, None, :]
+        )
+        counts["political_spectrum"] = spectrum_counts.sum(axis=(0, 1, 2))
+        return counts, spectrum_counts
+
+    # Chain the draws over the cells that influence affiliation:
+    # religion -> age group -> education -> spectrum
+    distributions = {
+        column: _normalized_weights(list(constants[key].values()))
+        for column, key in DEMOGRAPHIC_DISTRIBUTIONS.items()
+    }
+    religion_counts = rng.multinomial(num_simulations, distributions["religion"])
+    age_counts = rng.multinomial(religion_counts, distributions["age_group"])
+    education_counts = rng.multinomial(age_counts, distributions["education"])
+    spectrum_counts = rng.multinomial(
+        education_counts, spectrum_weights[None, :, None, :]
+    )
+
+    # The remaining attributes do not influence affiliation
+    counts = {
+        column: _draw_category_counts(rng, num_simulations, distributions[column])
+        for column in ["gender", "literacy", "location"]
+    }
+    counts["religion"] = religion_counts
+    counts["age_group"] = age_counts.sum(axis=0)
+    counts["education"] = education_counts.sum(axis=(0, 1))
+    counts["political_spectrum"] = spectrum_counts.sum(axis=(0, 1, 2))
+
+    return counts, spectrum_counts
+
+
+# Draw party counts for religion x age group x education x spectrum cell counts
+def draw_affiliation_counts(spectrum_counts, affiliation_table, rng=None):
+    rng = np.random.default_rng(rng)
+    cell_counts = rng.multinomial(spectrum_counts, affiliation_table[:, None])
+    return cell_counts.sum(axis=(0, 1, 2, 3))
+
+
+# Label per-category counts with the population categories
+def _counts_to_series(counts, categories):
+    return {
+        column: pd.Series(
+            counts[column],
+            index=pd.Index(categories[column], name=column),
+            name="count",
+        )
+        for column in categories
+    }
+
+
+# Simulate only the category counts, without materializing individual voters
+@instrumented("simulate_counts")
+def simulate_counts(
+    num_simulations,
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    rng=None,
+    affiliation_table=None,
+):
+    rng = np.random.default_rng(rng)
+    if affiliation_table is None:
+        affiliation_table = compile_affiliation_table(
             year,
             constants,
             parties,
@@ -250,19 +801,430 @@ def run_simulation(
             demographic_probabilities,
             historical_data,
         )
-        for _ in range(num_simulations)
-    ]
-    return pd.DataFrame(individuals)
+
+    counts, spectrum_counts = simulate_demographic_counts(
+        num_simulations, constants, parties, political_spectrums, rng
+    )
+    counts["political_affiliation"] = draw_affiliation_counts(
+        spectrum_counts, affiliation_table, rng
+    )
+    count("voters", num_simulations)
+
+    return _counts_to_series(
+        counts, define_categories(constants, parties, political_spectrums)
+    )
+
+
+# Simulate the population in fixed-size chunks, keeping only running aggregates
+@instrumented("simulate_streaming")
+def simulate_streaming(
+    num_simulations,
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    chunk_size=1_000_000,
+    rng=None,
+    affiliation_table=None,
+    spill_dir=None,
+    spill_format="npz",
+):
+    rng = np.random.default_rng(rng)
+    categories = define_categories(constants, parties, political_spectrums)
+    if affiliation_table is None:
+        affiliation_table = compile_affiliation_table(
+            year,
+            constants,
+            parties,
+            political_spectrums,
+            demographic_probabilities,
+            historical_data,
+        )
+    if spill_dir is not None:
+        os.makedirs(spill_dir, exist_ok=True)
+
+    num_parties = len(parties)
+    crosstab_counts = {
+        column: np.zeros(len(labels) * num_parties, dtype=np.int64)
+        for column, labels in categories.items()
+        if column != "political_affiliation"
+    }
+    affiliation_counts = np.zeros(num_parties, dtype=np.int64)
+
+    for chunk_index, start in enumerate(range(0, num_simulations, chunk_size)):
+        population = simulate_population(
+            min(chunk_size, num_simulations - start),
+            year,
+            constants,
+            parties,
+            political_spectrums,
+            demographic_probabilities,
+            historical_data,
+            rng=rng,
+            affiliation_table=affiliation_table,
+        )
+        affiliation = population["political_affiliation"]
+        affiliation_counts += np.bincount(affiliation, minlength=num_parties)
+        for column, counts in crosstab_counts.items():
+            counts += np.bincount(
+                population[column].astype(np.int64) * num_parties + affiliation,
+                minlength=len(counts),
+            )
+
+        if spill_dir is not None:
+            path = os.path.join(spill_dir, f"chunk_{chunk_index:05d}.{spill_format}")
+            if spill_format == "npz":
+                np.savez_compressed(path, **population)
+            elif spill_format == "parquet":
+                pd.DataFrame(population).to_parquet(path, index=False)
+            else:
+                raise ValueError(f"Unknown spill format: {spill_format}")
+        del population
+
+    party_index = pd.Index(categories["political_affiliation"], name="party")
+    crosstabs = {
+        column: pd.DataFrame(
+            counts.reshape(-1, num_parties),
+            index=pd.Index(categories[column], name=column),
+            columns=party_index,
+        )
+        for column, counts in crosstab_counts.items()
+    }
+    counts = {
+        column: crosstab.sum(axis=1).rename("count")
+        for column, crosstab in crosstabs.items()
+    }
+    counts["political_affiliation"] = pd.Series(
+        affiliation_counts,
+        index=party_index.rename("political_affiliation"),
+        name="count",
+    )
+    return counts, crosstabs
+
+
+# Confidence intervals of the party shares from the runs so far: Wilson
+# intervals on the pooled counts for independent draws, whose variance is
+# binomial, and t intervals on the run means for the variance-reduced
+# sampling methods, whose variance has to be estimated. The latter are
+# approximate; with the floor below they cover 93-98% per party at 95%
+def _share_intervals(run_counts, run_sizes, confidence, sampling):
+    counts = run_counts.sum(axis=0)
+    num_simulations = run_sizes.sum()
+    shares = counts / num_simulations
+    if sampling == "random":
+        z = stats.norm.ppf((1 + confidence) / 2)
+        denominator = 1 + z**2 / num_simulations
+        center = (shares + z**2 / (2 * num_simulations)) / denominator
+        half_width = (
+            z
+            * np.sqrt(
+                shares * (1 - shares) / num_simulations
+                + z**2 / (4 * num_simulations**2)
+            )
+            / denominator
+        )
+    elif len(run_sizes) < 2:
+        # One run says nothing about the spread of the run means
+        center, half_width = shares, np.full(len(shares), np.inf)
+    else:
+        num_runs = len(run_sizes)
+        run_shares = run_counts / run_sizes[:, None]
+        # Run shares move in steps of one voter, so a spread below one voter
+        # per run is a too-small estimate rather than a real one; without the
+        # floor, small parties get zero-width intervals after a single batch
+        variance = np.maximum(run_shares.var(axis=0, ddof=1), 1 / run_sizes.mean() ** 2)
+        standard_error = np.sqrt(variance / num_runs)
+        center = shares
+        half_width = stats.t.ppf((1 + confidence) / 2, num_runs - 1) * standard_error
+    return (
+        shares,
+        np.clip(center - half_width, 0, 1),
+        np.clip(center + half_width, 0, 1),
+    )
+
+
+# Simulate in batches of batch_size voters until the confidence interval of
+# every party's share is at most tolerance wide, or max_simulations voters
+# have been simulated; returns the category counts, the per-party intervals
+# and the number of voters used. With a variance-reduced sampling method each
+# batch is split into subreplicates independent runs, whose spread gives the
+# interval, so the run can stop after its first batch
+@instrumented("simulate_until_precise")
+def simulate_until_precise(
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    tolerance=0.01,
+    confidence=0.95,
+    batch_size=10_000,
+    max_simulations=10_000_000,
+    subreplicates=10,
+    rng=None,
+    affiliation_table=None,
+    engine="counts",
+    sampling="random",
+):
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError(f"Unknown sampling method: {sampling}")
+    if engine not in ["counts", "population"]:
+        raise ValueError(f"Unknown simulation engine: {engine}")
+    if sampling != "random" and engine != "population":
+        raise ValueError(f"Sampling method {sampling} needs the population engine")
+    if sampling != "random" and subreplicates < 2:
+        raise ValueError("Variance-reduced sampling needs at least 2 subreplicates")
+    if max_simulations < 1:
+        raise ValueError("max_simulations must be positive")
+    rng = np.random.default_rng(rng)
+    categories = define_categories(constants, parties, political_spectrums)
+    if affiliation_table is None:
+        affiliation_table = compile_affiliation_table(
+            year,
+            constants,
+            parties,
+            political_spectrums,
+            demographic_probabilities,
+            historical_data,
+        )
+
+    # Independent draws have a known variance, so a batch is a single run
+    num_runs = 1 if sampling == "random" else subreplicates
+    totals = {
+        column: np.zeros(len(labels), dtype=np.int64)
+        for column, labels in categories.items()
+    }
+    run_counts, run_sizes = [], []
+    num_simulations = 0
+    while num_simulations < max_simulations:
+        size = min(batch_size, max_simulations - num_simulations)
+        for run in range(num_runs):
+            run_size = size // num_runs + (run < size % num_runs)
+            if run_size == 0:
+                continue
+            if engine == "counts":
+                counts = simulate_counts(
+                    run_size,
+                    year,
+                    constants,
+                    parties,
+                    political_spectrums,
+                    demographic_probabilities,
+                    historical_data,
+                    rng=rng,
+                    affiliation_table=affiliation_table,
+                )
+                counts = {
+                    column: values.to_numpy() for column, values in counts.items()
+                }
+            else:
+                population = simulate_population(
+                    run_size,
+                    year,
+                    constants,
+                    parties,
+                    political_spectrums,
+                    demographic_probabilities,
+                    historical_data,
+                    rng=rng,
+                    affiliation_table=affiliation_table,
+                    sampling=sampling,
+                )
+                counts = {
+                    column: np.bincount(codes, minlength=len(categories[column]))
+                    for column, codes in population.items()
+                }
+            for column, values in counts.items():
+                totals[column] += values
+            run_counts.append(counts["political_affiliation"])
+            run_sizes.append(run_size)
+        num_simulations += size
+
+        shares, lower, upper = _share_intervals(
+            np.array(run_counts), np.array(run_sizes), confidence, sampling
+        )
+        if (upper - lower).max() <= tolerance:
+            break
+
+    intervals = pd.DataFrame(
+        {"share": shares, "lower": lower, "upper": upper, "width": upper - lower},
+        index=pd.Index(categories["political_affiliation"], name="party"),
+    )
+    return _counts_to_series(totals, categories), intervals, num_simulations
+
+
+# Exact expected share of every category, summed over the joint
+# demographic distribution instead of sampled
+def expected_shares(
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    affiliation_table=None,
+):
+    categories = define_categories(constants, parties, political_spectrums)
+    if affiliation_table is None:
+        affiliation_table = compile_affiliation_table(
+            year,
+            constants,
+            parties,
+            political_spectrums,
+            demographic_probabilities,
+            historical_data,
+        )
+
+    spectrum_weights = _normalized_weights(
+        _spectrum_weights(categories, political_spectrums)
+    )
+    if conditional_distributions(constants):
+        # Affiliation depends on religion x age group x education jointly
+        columns = list(DEMOGRAPHIC_DISTRIBUTIONS)
+        joint = demographic_joint_probabilities(constants)
+        shares = {
+            column: joint.sum(
+                axis=tuple(axis for axis in range(len(columns)) if axis != i)
+            )
+            for i, column in enumerate(columns)
+        }
+        cells = affiliation_cells(joint)
+        shares["political_spectrum"] = shares["age_group"] @ spectrum_weights
+        shares["political_affiliation"] = np.einsum(
+            "rae,as,resp->p", cells, spectrum_weights, affiliation_table
+        )
+    else:
+        shares = {
+            column: _normalized_weights(list(constants[key].values()))
+            for column, key in DEMOGRAPHIC_DISTRIBUTIONS.items()
+        }
+        shares["political_spectrum"] = shares["age_group"] @ spectrum_weights
+        shares["political_affiliation"] = np.einsum(
+            "r,e,s,resp->p",
+            shares["religion"],
+            shares["education"],
+            shares["political_spectrum"],
+            affiliation_table,
+        )
+
+    return {
+        column: pd.Series(
+            shares[column],
+            index=pd.Index(categories[column], name=column),
+            name="proportion",
+        )
+        for column in categories
+    }
+
+
+# Analytic sampling variance of simulated shares for a given population size
+def share_variance(shares, num_simulations):
+    return {
+        column: (proportions * (1 - proportions) / num_simulations).rename("variance")
+        for column, proportions in shares.items()
+    }
+
+
+# Simulate every election year in the historical data in one pass
+def simulate_all_years(
+    num_simulations,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    rng=None,
+    engine="population",
+    years=None,
+):
+    rng = np.random.default_rng(rng)
+    if years is None:
+        years = election_years(historical_data)
+
+    # Demographics and spectrums do not depend on the year, so draw them once
+    if engine == "population":
+        population = simulate_demographics(
+            num_simulations, constants, parties, political_spectrums, rng
+        )
+    elif engine == "counts":
+        _, spectrum_counts = simulate_demographic_counts(
+            num_simulations, constants, parties, political_spectrums, rng
+        )
+    else:
+        raise ValueError(f"Unknown simulation engine: {engine}")
+
+    rows = []
+    for year in years:
+        affiliation_table = compile_affiliation_table(
+            year,
+            constants,
+            parties,
+            political_spectrums,
+            demographic_probabilities,
+            historical_data,
+        )
+        if engine == "population":
+            affiliation_counts = np.bincount(
+                draw_affiliations(population, affiliation_table, rng),
+                minlength=len(parties),
+            )
+        else:
+            affiliation_counts = draw_affiliation_counts(
+                spectrum_counts, affiliation_table, rng
+            )
+
+        real_results = year_results(historical_data, year)
+        for party, count in zip(parties, affiliation_counts):
+            rows.append(
+                {
+                    "Year": year,
+                    "Party": party,
+                    "Simulated Vote Share (%)": count / num_simulations * 100,
+                    "Vote Share (%)": real_results.get(party, np.nan),
+                }
+            )
+
+    return pd.DataFrame(rows)
+
+
+# Shared categorical dtypes for the population columns
+def define_category_dtypes(categories):
+    return {
+        column: pd.CategoricalDtype(labels) for column, labels in categories.items()
+    }
+
+
+# Wrap an integer-coded population in a DataFrame of categorical columns
+@instrumented("population_to_frame")
+def population_to_frame(population, categories):
+    dtypes = define_category_dtypes(categories)
+    return pd.DataFrame(
+        {
+            column: pd.Categorical.from_codes(codes, dtype=dtypes[column])
+            for column, codes in population.items()
+        }
+    )
 
 
 # Analyze results
+@instrumented("analyze_results")
 def analyze_results(simulated_population, historical_data, year):
+    if isinstance(simulated_population, pd.DataFrame):
+        affiliation_counts = simulated_population[
+            "political_affiliation"
+        ].value_counts()
+    else:
+        # Counts from simulate_counts or simulate_streaming, or expected_shares
+        affiliation_counts = simulated_population["political_affiliation"].sort_values(
+            ascending=False
+        )
     simulated_results = (
-        simulated_population["political_affiliation"].value_counts(normalize=True) * 100
-    )
-    real_results = historical_data[historical_data["Year"] == year][
-        ["Party", "Vote Share (%)"]
-    ].set_index("Party")
+        affiliation_counts[affiliation_counts > 0] / affiliation_counts.sum() * 100
+    ).rename("proportion")
+    real_results = year_results(historical_data, year).to_frame()
 
     all_parties = set(simulated_results.index) | set(real_results.index)
     aligned_results = {party: {"simulated": 0, "real": 0} for party in all_parties}
@@ -281,6 +1243,7 @@ def analyze_results(simulated_population, historical_data, year):
 
 
 # Perform chi-square test
+@instrumented("safe_chisquare")
 def safe_chisquare(observed, expected, epsilon=1e-8):
     observed, expected = np.array(observed), np.array(expected)
     expected = expected + epsilon
@@ -312,9 +1275,9 @@ def main():
         analyze_results(simulated_population, historical_data, year)
     )
 
-    print("Simulated Political Affiliation Distribution for 2008 (%):")
+    print(f"Simulated Political Affiliation Distribution for {year} (%):")
     print(simulated_results)
-    print("\nReal Election Results for 2008 (%):")
+    print(f"\nReal Election Results for {year} (%):")
     print(real_results)
 
     print("\nAligned Results:")
@@ -326,6 +1289,36 @@ def main():
             f"{party}: Simulated {sim:.2f}%, Real {real:.2f}%, Difference {diff:.2f}%"
         )
 
+    # Exact expected shares show how much of the gap is sampling noise
+    exact_shares = expected_shares(
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+    )
+    standard_errors = share_variance(exact_shares, constants["population_size"])
+    print(f"\nExact Expected Political Affiliation Distribution for {year} (%):")
+    for party, share in exact_shares["political_affiliation"].items():
+        standard_error = np.sqrt(standard_errors["political_affiliation"][party])
+        print(f"{party}: {share:.2%} (sampling SE {standard_error:.2%})")
+
+    # Voters needed before every party's share is known to within a point
+    _, intervals, voters_used = simulate_until_precise(
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+        tolerance=0.01,
+    )
+    print(
+        f"\n95% intervals at most 1 point wide for every party after {voters_used} "
+        f"voters (widest {intervals['width'].max():.2%})"
+    )
+
     chi2, p_value = safe_chisquare(observed, expected)
     print("\nHypothesis Test Results:")
     print(f"Chi-square statistic: {chi2}")
@@ -0,0 +1,405 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bangladesh_election_simulation import (
+    analyze_results,
+    compile_affiliation_table,
+    define_categories,
+    define_demographic_probabilities,
+    define_parties_and_spectrums,
+    load_data_and_constants,
+    population_to_frame,
+    run_simulation,
+    safe_chisquare,
+    simulate_counts,
+    simulate_individual,
+    simulate_population,
+)
+from election_data import clear_election_cache, read_election_csv, results_table
+from metrics import score_replicates
+from reverse_political_spectrum import (
+    infer_spectrum_distribution,
+    load_election_votes,
+    parties_spectrum,
+    political_spectrums as spectrum_names,
+    resample_vote_shares,
+)
+
+DATA_FILE = "bangladesh_elections_data.csv"
+BASELINE_FILE = "benchmark_baseline.json"
+BENCHMARK_YEAR = 2001
+BENCHMARK_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+
+# Model inputs shared by every simulation stage
+def _model_args(state):
+    return (
+        BENCHMARK_YEAR,
+        state["constants"],
+        state["parties"],
+        state["political_spectrums"],
+        state["demographic_probabilities"],
+        state["historical_data"],
+    )
+
+
+# Stage: load the election data and model definitions from cold; the parsed
+# file is memoized per process, so drop the memo and parse the CSV without the
+# snapshot, or every repeat after the first would only time a cache hit
+def _load_model(state, size):
+    clear_election_cache()
+    read_election_csv(DATA_FILE, use_snapshot=False)
+    state["historical_data"], state["constants"] = load_data_and_constants()
+    state["parties"], state["political_spectrums"] = define_parties_and_spectrums()
+    state["demographic_probabilities"] = define_demographic_probabilities()
+
+
+# Stage: compile the affiliation table
+def _compile_affiliation_table(state, size):
+    state["affiliation_table"] = compile_affiliation_table(*_model_args(state))
+
+
+# Stage: the per-voter engine, one DataFrame for the whole population
+def _run_simulation(state, size):
+    state["population"] = run_simulation(size, *_model_args(state))
+
+
+# Stage: call simulate_individual once per voter, as the original engine did
+def _simulate_individual(state, size):
+    state["individuals"] = [
+        simulate_individual(*_model_args(state)) for _ in range(size)
+    ]
+
+
+# Stage: the vectorized engine, integer codes per column
+def _simulate_population(state, size):
+    state["codes"] = simulate_population(
+        size,
+        *_model_args(state),
+        rng=0,
+        affiliation_table=state["affiliation_table"],
+    )
+
+
+# Stage: wrap the integer codes in a categorical DataFrame
+def _population_to_frame(state, size):
+    categories = define_categories(
+        state["constants"], state["parties"], state["political_spectrums"]
+    )
+    state["population"] = population_to_frame(state["codes"], categories)
+
+
+# Stage: the counts-only engine
+def _simulate_counts(state, size):
+    state["population"] = simulate_counts(
+        size,
+        *_model_args(state),
+        rng=0,
+        affiliation_table=state["affiliation_table"],
+    )
+
+
+# Stage: compare the simulated population with the historical results
+def _analyze_results(state, size):
+    state["analysis"] = analyze_results(
+        state["population"], state["historical_data"], BENCHMARK_YEAR
+    )
+
+
+# Stage: chi-square test of the analysis
+def _safe_chisquare(state, size):
+    _, _, _, observed, expected = state["analysis"]
+    state["chisquare"] = safe_chisquare(observed, expected)
+
+
+# Stage: bootstrap resamples of the vote counts to infer from
+def _resample_vote_shares(state, size):
+    state["vote_shares"] = resample_vote_shares(
+        load_election_votes(DATA_FILE, BENCHMARK_YEAR), size, rng=0
+    )
+
+
+# Stage: one spectrum inference per resample
+def _infer_spectrum_distribution(state, size):
+    state["inferred"] = [
+        infer_spectrum_distribution(row, parties_spectrum, spectrum_names)
+        for _, row in state["vote_shares"].iterrows()
+    ]
+
+
+# Stage: replicate vote shares for every year around the historical shares
+def _draw_replicate_shares(state, size):
+    actual = (
+        results_table(state["historical_data"])
+        .reindex(columns=list(state["parties"]))
+        .to_numpy()
+    )
+    probabilities = np.nan_to_num(actual) + 1e-3
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+    rng = np.random.default_rng(0)
+    state["actual"] = actual
+    state["simulated"] = (
+        rng.multinomial(10_000, probabilities, (size, len(actual))) / 100
+    )
+
+
+# Stage: score every replicate
+def _score_replicates(state, size):
+    state["scores"] = score_replicates(state["simulated"], state["actual"])
+
+
+# Benchmarks as ordered stages; throughput is measured on one stage, in the
+# given unit, and max_size caps the default sizes of slow per-voter paths
+BENCHMARKS = {
+    "run_simulation": {
+        "unit": "voters",
+        "throughput_stage": "run_simulation",
+        "max_size": 100_000,
+        "stages": [
+            ("load_data_and_constants", _load_model),
+            ("run_simulation", _run_simulation),
+            ("analyze_results", _analyze_results),
+            ("safe_chisquare", _safe_chisquare),
+        ],
+    },
+    "simulate_individual": {
+        "unit": "voters",
+        "throughput_stage": "simulate_individual",
+        "max_size": 10_000,
+        "stages": [
+            ("load_data_and_constants", _load_model),
+            ("simulate_individual", _simulate_individual),
+        ],
+    },
+    "simulate_population": {
+        "unit": "voters",
+        "throughput_stage": "simulate_population",
+        "stages": [
+            ("load_data_and_constants", _load_model),
+            ("compile_affiliation_table", _compile_affiliation_table),
+            ("simulate_population", _simulate_population),
+            ("population_to_frame", _population_to_frame),
+            ("analyze_results", _analyze_results),
+            ("safe_chisquare", _safe_chisquare),
+        ],
+    },
+    "simulate_counts": {
+        "unit": "voters",
+        "throughput_stage": "simulate_counts",
+        "stages": [
+            ("load_data_and_constants", _load_model),
+            ("compile_affiliation_table", _compile_affiliation_table),
+            ("simulate_counts", _simulate_counts),
+            ("analyze_results", _analyze_results),
+            ("safe_chisquare", _safe_chisquare),
+        ],
+    },
+    "infer_spectrum_distribution": {
+        "unit": "solves",
+        "throughput_stage": "infer_spectrum_distribution",
+        "sizes": [1, 10, 100],
+        "stages": [
+            ("resample_vote_shares", _resample_vote_shares),
+            ("infer_spectrum_distribution", _infer_spectrum_distribution),
+        ],
+    },
+    "score_replicates": {
+        "unit": "replicates",
+        "throughput_stage": "score_replicates",
+        "max_size": 1_000_000,
+        "stages": [
+            ("load_data_and_constants", _load_model),
+            ("draw_replicate_shares", _draw_replicate_shares),
+            ("score_replicates", _score_replicates),
+        ],
+    },
+}
+
+
+# Sizes a benchmark runs at when none are given
+def default_sizes(name):
+    benchmark = BENCHMARKS[name]
+    if "sizes" in benchmark:
+        return benchmark["sizes"]
+    max_size = benchmark.get("max_size", BENCHMARK_SIZES[-1])
+    return [size for size in BENCHMARK_SIZES if size <= max_size]
+
+
+# Run one benchmark at one size, keeping the fastest time of every stage
+def run_case(name, size, repeat=3):
+    benchmark = BENCHMARKS[name]
+    stages = {stage: float("inf") for stage, _ in benchmark["stages"]}
+    for _ in range(repeat):
+        state = {}
+        for stage, function in benchmark["stages"]:
+            start = time.perf_counter()
+            function(state, size)
+            stages[stage] = min(stages[stage], time.perf_counter() - start)
+        del state
+
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "benchmark": name,
+        "size": size,
+        "unit": benchmark["unit"],
+        "stages": stages,
+        "total_seconds": sum(stages.values()),
+        "throughput": size / max(stages[benchmark["throughput_stage"]], 1e-12),
+        "peak_rss_mb": peak_rss,
+    }
+
+
+# Run the selected benchmarks; each case runs in a fresh interpreter so its
+# peak RSS is its own and not the high-water mark of earlier cases
+def run_benchmarks(names=None, sizes=None, repeat=3, isolate=True):
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for name in names or list(BENCHMARKS):
+        for size in sizes or default_sizes(name):
+            if isolate:
+                with ProcessPoolExecutor(1, mp_context=context) as executor:
+                    result = executor.submit(run_case, name, size, repeat).result()
+            else:
+                result = run_case(name, size, repeat)
+            results.append(result)
+            print(format_result(result), flush=True)
+    return results
+
+
+# One line of the text report
+def format_result(result):
+    stages = ", ".join(
+        f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in result["stages"].items()
+    )
+    return (
+        f"{result['benchmark']:<28} {result['size']:>10,} "
+        f"{result['throughput']:>14,.0f} {result['unit']}/s "
+        f"{result['peak_rss_mb']:>8.1f} MB peak  [{stages}]"
+    )
+
+
+# Key of a benchmark case in the baseline file
+def _case_key(result):
+    return f"{result['benchmark']}:{result['size']}"
+
+
+# The machine the results were measured on
+def machine_info():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+# Store results as the baseline for later runs
+def save_baseline(results, path=BASELINE_FILE):
+    baseline = {
+        "machine": machine_info(),
+        "results": {_case_key(result): result for result in results},
+    }
+    with open(path, "w") as file:
+        json.dump(baseline, file, indent=2)
+
+
+# Load a stored baseline, or None when there is none yet
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+# Stages that got slower than the baseline by more than the tolerance;
+# differences below min_seconds are treated as timer noise
+def find_regressions(results, baseline, tolerance=0.25, min_seconds=0.001):
+    regressions = []
+    for result in results:
+        reference = baseline["results"].get(_case_key(result))
+        if reference is None:
+            continue
+        timings = dict(result["stages"], total=result["total_seconds"])
+        reference_timings = dict(reference["stages"], total=reference["total_seconds"])
+        for stage, seconds in timings.items():
+            baseline_seconds = reference_timings.get(stage)
+            if baseline_seconds is None:
+                continue
+            if (
+                seconds > baseline_seconds * (1 + tolerance)
+                and seconds - baseline_seconds > min_seconds
+            ):
+                regressions.append(
+                    {
+                        "benchmark": result["benchmark"],
+                        "size": result["size"],
+                        "stage": stage,
+                        "baseline_seconds": baseline_seconds,
+                        "seconds": seconds,
+                        "ratio": seconds / baseline_seconds,
+                    }
+                )
+    return regressions
+
+
+# Main function
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation hot paths")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("--sizes", nargs="+", type=int)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--no-isolate", action="store_true")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        args.benchmarks, args.sizes, args.repeat, isolate=not args.no_isolate
+    )
+
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    regressions = (
+        find_regressions(results, baseline, args.tolerance) if baseline else []
+    )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    "machine": machine_info(),
+                    "results": results,
+                    "regressions": regressions,
+                },
+                file,
+                indent=2,
+            )
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+    elif baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to store one")
+
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['benchmark']} {regression['size']:,} "
+            f"{regression['stage']}: {regression['baseline_seconds'] * 1000:.1f}ms -> "
+            f"{regression['seconds'] * 1000:.1f}ms ({regression['ratio']:.2f}x)"
+        )
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
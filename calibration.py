@@ -0,0 +1,403 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+from bangladesh_election_simulation import (
+    _demographic_factor_arrays,
+    _normalized_weights,
+    _spectrum_multipliers,
+    _spectrum_weights,
+    affiliation_cells,
+    conditional_distributions,
+    define_categories,
+    define_demographic_probabilities,
+    define_parties_and_spectrums,
+    demographic_joint_probabilities,
+    get_party_probabilities,
+    load_data_and_constants,
+)
+from election_data import election_years, results_table
+from result_cache import cache_key
+
+
+# Fixed model inputs shared by every evaluation of the calibration loss
+def build_calibration_arrays(
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    years=None,
+):
+    categories = define_categories(constants, parties, political_spectrums)
+    if years is None:
+        years = election_years(historical_data)
+
+    base = np.array(
+        [
+            list(get_party_probabilities(historical_data, year, parties).values())
+            for year in years
+        ]
+    )
+    real_shares = (
+        results_table(historical_data)
+        .reindex(index=years, columns=list(parties))
+        .fillna(0)
+        .to_numpy()
+        / 100
+    )
+
+    religion_factors, education_factors = _demographic_factor_arrays(
+        categories, demographic_probabilities
+    )
+    # Conditional tables tie the demographics together, so the fit has to
+    # average over their joint [religion, age, education] cells
+    cells = None
+    if conditional_distributions(constants):
+        cells = affiliation_cells(demographic_joint_probabilities(constants))
+    return {
+        "categories": categories,
+        "years": list(years),
+        "base": base,
+        "real_shares": real_shares,
+        "religion_distribution": _normalized_weights(
+            list(constants["religion_distribution"].values())
+        ),
+        "age_distribution": _normalized_weights(
+            list(constants["age_distribution"].values())
+        ),
+        "education_distribution": _normalized_weights(
+            list(constants["education_distribution"].values())
+        ),
+        "cells": cells,
+        "spectrum_multipliers": _spectrum_multipliers(categories, parties),
+        "initial_parameters": pack_parameters(
+            religion_factors,
+            education_factors,
+            _spectrum_weights(categories, political_spectrums),
+        ),
+        "shapes": [
+            religion_factors.shape,
+            education_factors.shape,
+            (len(categories["age_group"]), len(categories["political_spectrum"])),
+        ],
+    }
+
+
+# Flatten the calibrated tables into one log-space parameter vector
+def pack_parameters(religion_factors, education_factors, spectrum_weights):
+    return np.log(
+        np.concatenate(
+            [
+                religion_factors.ravel(),
+                education_factors.ravel(),
+                spectrum_weights.ravel(),
+            ]
+        )
+    )
+
+
+# Split a log-space parameter vector back into the calibrated tables
+def unpack_parameters(parameters, shapes):
+    values = np.exp(parameters)
+    tables = []
+    offset = 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        tables.append(values[offset : offset + size].reshape(shape))
+        offset += size
+    return tables
+
+
+# Expected vote share of every party in every year under the given parameters
+def expected_vote_shares(parameters, arrays):
+    religion_factors, education_factors, spectrum_weights = unpack_parameters(
+        parameters, arrays["shapes"]
+    )
+    table = (
+        arrays["base"][:, None, None, None, :]
+        * religion_factors.T[None, :, None, None, :]
+        * education_factors.T[None, None, :, None, :]
+        * arrays["spectrum_multipliers"].T[None, None, None, :, :]
+    )
+    table /= table.sum(axis=-1, keepdims=True)
+    if arrays["cells"] is not None:
+        return np.einsum(
+            "rae,as,yresp->yp",
+            arrays["cells"],
+            _normalized_weights(spectrum_weights),
+            table,
+        )
+
+    spectrum_distribution = arrays["age_distribution"] @ _normalized_weights(
+        spectrum_weights
+    )
+    return np.einsum(
+        "r,e,s,yresp->yp",
+        arrays["religion_distribution"],
+        arrays["education_distribution"],
+        spectrum_distribution,
+        table,
+    )
+
+
+# Divergence between expected and real vote shares across all years
+def calibration_loss(parameters, arrays, loss="kl", regularization=1e-3):
+    expected = expected_vote_shares(parameters, arrays)
+    real = arrays["real_shares"]
+    if loss == "kl":
+        # Real shares leave out minor parties, so compare within the table
+        real = real / real.sum(axis=1, keepdims=True)
+        observed = real > 0
+        value = np.sum(real[observed] * np.log(real[observed] / expected[observed]))
+    elif loss == "sse":
+        value = np.sum((expected - real) ** 2)
+    else:
+        raise ValueError(f"Unknown calibration loss: {loss}")
+
+    # Keep the fit close to the hand-set tables where the data do not decide
+    penalty = parameters - arrays["initial_parameters"]
+    return value + regularization * penalty @ penalty
+
+
+# Path of the checkpoint file for one start
+def _checkpoint_path(checkpoint_dir, start):
+    return os.path.join(checkpoint_dir, f"start_{start:04d}.json")
+
+
+# Atomically write the progress of one start, with the settings it ran under
+def _write_checkpoint(checkpoint_dir, start, settings, parameters, loss_value, done):
+    path = _checkpoint_path(checkpoint_dir, start)
+    with open(path + ".tmp", "w") as file:
+        json.dump(
+            {
+                "settings": settings,
+                "parameters": [float(value) for value in parameters],
+                "loss": loss_value,
+                "done": done,
+            },
+            file,
+        )
+    os.replace(path + ".tmp", path)
+
+
+# Read the progress of one start, if it has a checkpoint
+def _read_checkpoint(checkpoint_dir, start):
+    if checkpoint_dir is None:
+        return None
+    path = _checkpoint_path(checkpoint_dir, start)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+# Run one start of the optimizer, resuming from its checkpoint if present
+def _run_start(
+    start,
+    initial_parameters,
+    arrays,
+    loss,
+    regularization,
+    max_iterations,
+    checkpoint_dir,
+    checkpoint_every,
+):
+    # A checkpoint written under other settings or data belongs to a
+    # different fit
+    settings = {
+        "data": cache_key(arrays),
+        "loss": loss,
+        "regularization": float(regularization),
+        "initial_parameters": [float(value) for value in initial_parameters],
+    }
+    checkpoint = _read_checkpoint(checkpoint_dir, start)
+    if checkpoint is not None and checkpoint.get("settings") == settings:
+        if checkpoint["done"]:
+            return start, np.array(checkpoint["parameters"]), checkpoint["loss"], 0
+        initial_parameters = np.array(checkpoint["parameters"])
+
+    iterations = 0
+
+    def save_progress(parameters):
+        nonlocal iterations
+        iterations += 1
+        if checkpoint_dir is not None and iterations % checkpoint_every == 0:
+            _write_checkpoint(
+                checkpoint_dir,
+                start,
+                settings,
+                parameters,
+                calibration_loss(parameters, arrays, loss, regularization),
+                False,
+            )
+
+    result = minimize(
+        calibration_loss,
+        initial_parameters,
+        args=(arrays, loss, regularization),
+        method="L-BFGS-B",
+        bounds=[(np.log(1e-4), np.log(1e2))] * len(initial_parameters),
+        callback=save_progress,
+        options={"maxiter": max_iterations},
+    )
+    # A start cut short by max_iterations stays open, so a rerun with a larger
+    # budget continues it
+    if checkpoint_dir is not None:
+        _write_checkpoint(
+            checkpoint_dir,
+            start,
+            settings,
+            result.x,
+            float(result.fun),
+            bool(result.success),
+        )
+    return start, result.x, float(result.fun), iterations
+
+
+# Convert calibrated tables back into the model's dictionary form
+def parameters_to_tables(parameters, arrays, parties):
+    categories = arrays["categories"]
+    religion_factors, education_factors, spectrum_weights = unpack_parameters(
+        parameters, arrays["shapes"]
+    )
+    demographic_probabilities = {
+        factor: {
+            party: dict(zip(categories[factor], map(float, factors[i])))
+            for i, party in enumerate(parties)
+        }
+        for factor, factors in [
+            ("religion", religion_factors),
+            ("education", education_factors),
+        ]
+    }
+    political_spectrums = {
+        spectrum: dict(zip(categories["age_group"], map(float, spectrum_weights[:, j])))
+        for j, spectrum in enumerate(categories["political_spectrum"])
+    }
+    return political_spectrums, demographic_probabilities
+
+
+# Fit the demographic multipliers and age tables to the historical vote shares
+def calibrate(
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    num_starts=8,
+    perturbation=0.5,
+    loss="kl",
+    regularization=1e-3,
+    max_iterations=500,
+    seed=None,
+    workers=None,
+    checkpoint_dir=None,
+    checkpoint_every=10,
+):
+    arrays = build_calibration_arrays(
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+    )
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    # The first start is the hand-set model; the others are log-space jitters
+    rng = np.random.default_rng(seed)
+    initial_parameters = arrays["initial_parameters"]
+    starts = [initial_parameters] + [
+        initial_parameters + rng.normal(0, perturbation, len(initial_parameters))
+        for _ in range(num_starts - 1)
+    ]
+    run_args = [
+        (
+            start,
+            parameters,
+            arrays,
+            loss,
+            regularization,
+            max_iterations,
+            checkpoint_dir,
+            checkpoint_every,
+        )
+        for start, parameters in enumerate(starts)
+    ]
+
+    workers = min(workers or os.cpu_count() or 1, num_starts)
+    if workers <= 1:
+        results = [_run_start(*args) for args in run_args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run_start, *zip(*run_args)))
+
+    summary = pd.DataFrame(
+        [
+            (start, loss_value, iterations)
+            for start, _, loss_value, iterations in results
+        ],
+        columns=["start", "loss", "iterations"],
+    ).set_index("start")
+    best_parameters = min(results, key=lambda result: result[2])[1]
+    political_spectrums, demographic_probabilities = parameters_to_tables(
+        best_parameters, arrays, parties
+    )
+    return political_spectrums, demographic_probabilities, summary
+
+
+# Main function
+def main():
+    historical_data, constants = load_data_and_constants()
+    parties, political_spectrums = define_parties_and_spectrums()
+    demographic_probabilities = define_demographic_probabilities()
+
+    arrays = build_calibration_arrays(
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+    )
+    initial_loss = calibration_loss(arrays["initial_parameters"], arrays)
+
+    calibrated_spectrums, calibrated_probabilities, summary = calibrate(
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+        seed=42,
+    )
+    calibrated_arrays = build_calibration_arrays(
+        constants,
+        parties,
+        calibrated_spectrums,
+        calibrated_probabilities,
+        historical_data,
+    )
+
+    print(f"Initial loss: {initial_loss:.6f}")
+    print(f"Calibrated loss: {summary['loss'].min():.6f}")
+    print("\nExpected vs Real Vote Share (%) after calibration:")
+    expected = pd.DataFrame(
+        expected_vote_shares(calibrated_arrays["initial_parameters"], calibrated_arrays)
+        * 100,
+        index=calibrated_arrays["years"],
+        columns=list(parties),
+    )
+    real = pd.DataFrame(
+        calibrated_arrays["real_shares"] * 100,
+        index=calibrated_arrays["years"],
+        columns=list(parties),
+    )
+    print(pd.concat({"expected": expected, "real": real}, axis=1).round(2))
+
+
+if __name__ == "__main__":
+    main()
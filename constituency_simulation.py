@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+from bangladesh_election_simulation import (
+    DEMOGRAPHIC_DISTRIBUTIONS,
+    _normalized_weights,
+    _spectrum_weights,
+    affiliation_cells,
+    compile_affiliation_table,
+    conditional_distributions,
+    define_categories,
+    define_demographic_probabilities,
+    define_parties_and_spectrums,
+    demographic_joint_probabilities,
+    load_data_and_constants,
+)
+from election_data import year_results
+
+
+# Draw a local demographic mix for every seat, scattered around the national
+# distributions with a Dirichlet; a larger concentration means less variation.
+# With conditional tables each seat scatters its marginals but keeps the
+# national tables, and also gets its joint [religion, age, education] cells
+def generate_constituencies(num_seats, constants, concentration=50, rng=None):
+    rng = np.random.default_rng(rng)
+    constituencies = {
+        column: rng.dirichlet(
+            concentration * _normalized_weights(list(constants[key].values())),
+            num_seats,
+        )
+        for column, key in DEMOGRAPHIC_DISTRIBUTIONS.items()
+    }
+    if not conditional_distributions(constants):
+        return constituencies
+
+    columns = list(DEMOGRAPHIC_DISTRIBUTIONS)
+    joints = np.array(
+        [
+            demographic_joint_probabilities(
+                {
+                    **constants,
+                    **{
+                        key: dict(zip(constants[key], constituencies[column][seat]))
+                        for column, key in DEMOGRAPHIC_DISTRIBUTIONS.items()
+                    },
+                }
+            )
+            for seat in range(num_seats)
+        ]
+    )
+    # A conditioned column's mix follows from its table, not from its draw
+    for i, column in enumerate(columns):
+        constituencies[column] = joints.sum(
+            axis=tuple(axis + 1 for axis in range(len(columns)) if axis != i)
+        )
+    constituencies["cells"] = np.array([affiliation_cells(joint) for joint in joints])
+    return constituencies
+
+
+# Exact expected party shares in every seat, shape [seat, party]
+def constituency_party_shares(
+    constituencies, affiliation_table, categories, political_spectrums
+):
+    spectrum_weights = _normalized_weights(
+        _spectrum_weights(categories, political_spectrums)
+    )
+    if "cells" in constituencies:
+        return np.einsum(
+            "krae,as,resp->kp",
+            constituencies["cells"],
+            spectrum_weights,
+            affiliation_table,
+        )
+
+    spectrum_distribution = constituencies["age_group"] @ spectrum_weights
+    return np.einsum(
+        "kr,ke,ks,resp->kp",
+        constituencies["religion"],
+        constituencies["education"],
+        spectrum_distribution,
+        affiliation_table,
+    )
+
+
+# Simulate first-past-the-post seat outcomes as [replicate, seat, party] arrays
+def simulate_seats(
+    num_replicates,
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    num_seats=300,
+    voters_per_seat=250_000,
+    concentration=50,
+    swing=0.0,
+    rng=None,
+    constituencies=None,
+):
+    rng = np.random.default_rng(rng)
+    categories = define_categories(constants, parties, political_spectrums)
+    if constituencies is None:
+        constituencies = generate_constituencies(
+            num_seats, constants, concentration, rng
+        )
+    affiliation_table = compile_affiliation_table(
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+    )
+    seat_shares = constituency_party_shares(
+        constituencies, affiliation_table, categories, political_spectrums
+    )
+
+    # Optional local swing: log-normal noise on each party's share per seat
+    shares = np.broadcast_to(seat_shares, (num_replicates, *seat_shares.shape))
+    if swing > 0:
+        shares = shares * rng.lognormal(0, swing, shares.shape)
+    shares = shares / shares.sum(axis=-1, keepdims=True)
+
+    vote_counts = rng.multinomial(voters_per_seat, shares)
+    winners = vote_counts.argmax(axis=-1)
+    seat_counts = (winners[..., None] == np.arange(len(parties))).sum(axis=1)
+
+    seats = pd.DataFrame(
+        seat_counts,
+        index=pd.RangeIndex(num_replicates, name="replicate"),
+        columns=pd.Index(list(parties), name="Party"),
+    )
+    return seats, vote_counts, constituencies
+
+
+# Compare projected seats with the historical seat counts for a year
+def compare_seats(seats, historical_data, year, percentiles=(2.5, 97.5)):
+    comparison = pd.DataFrame({"Projected Seats (mean)": seats.mean(axis=0)})
+    for percentile in percentiles:
+        comparison[f"Projected Seats (p{percentile:g})"] = np.percentile(
+            seats, percentile, axis=0
+        )
+    comparison["Seats Won"] = year_results(historical_data, year, "Seats Won").reindex(
+        comparison.index
+    )
+    comparison["Difference"] = (
+        comparison["Projected Seats (mean)"] - comparison["Seats Won"]
+    )
+    return comparison
+
+
+# Main function
+def main():
+    historical_data, constants = load_data_and_constants()
+    parties, political_spectrums = define_parties_and_spectrums()
+    demographic_probabilities = define_demographic_probabilities()
+
+    year = 2008
+    num_replicates = 1000
+    seats, _, _ = simulate_seats(
+        num_replicates,
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+        swing=0.3,
+        rng=42,
+    )
+
+    print(f"Projected vs Historical Seats for {year} ({num_replicates} replicates):")
+    print(compare_seats(seats, historical_data, year).round(1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import os
+import pickle
+import weakref
+
+import numpy as np
+import pandas as pd
+
+RESULT_COLUMNS = [
+    "Votes",
+    "Vote Share (%)",
+    "Seats Won",
+    "Reserved Seats",
+    "Total Seats",
+]
+
+# Parsed election files and their indexes, keyed by path, modification time
+# and size; callers only ever get copies of these frames
+_loaded_files = {}
+
+# Shape and year-indexed arrays of every results frame in use, keyed by
+# id(frame)
+_frame_indexes = {}
+
+
+# Dense year x party arrays for a frame of election results
+def build_election_index(historical_data):
+    years = np.sort(historical_data["Year"].unique())
+    parties = list(dict.fromkeys(historical_data["Party"]))
+    year_index = {int(year): i for i, year in enumerate(years)}
+    party_index = {party: j for j, party in enumerate(parties)}
+
+    rows = historical_data["Year"].map(year_index).to_numpy()
+    cols = historical_data["Party"].map(party_index).to_numpy()
+    values = {}
+    for column in RESULT_COLUMNS:
+        if column in historical_data:
+            array = np.full((len(years), len(parties)), np.nan)
+            array[rows, cols] = pd.to_numeric(
+                historical_data[column], errors="coerce"
+            ).to_numpy(dtype=float)
+            values[column] = array
+
+    # Party order within each year as it appears in the file
+    party_order = {year: [] for year in year_index}
+    for year, party in zip(historical_data["Year"], historical_data["Party"]):
+        party_order[int(year)].append(party_index[party])
+
+    return {
+        "years": years,
+        "parties": parties,
+        "year_index": year_index,
+        "party_index": party_index,
+        "party_order": party_order,
+        "values": values,
+    }
+
+
+# Remember the index of a frame until the frame is garbage collected
+def _store_index(historical_data, index):
+    key = id(historical_data)
+    if key not in _frame_indexes:
+        weakref.finalize(historical_data, _frame_indexes.pop, key, None)
+    _frame_indexes[key] = (historical_data.shape, index)
+
+
+# Year-indexed arrays for a results frame, built once per frame. Frames that
+# gain or lose rows or columns are re-indexed automatically; after editing
+# values in place, call invalidate_election_index
+def election_index(historical_data):
+    cached = _frame_indexes.get(id(historical_data))
+    if cached is not None and cached[0] == historical_data.shape:
+        return cached[1]
+    index = build_election_index(historical_data)
+    _store_index(historical_data, index)
+    return index
+
+
+# Drop the index of a frame, so the next lookup rebuilds it from the frame
+def invalidate_election_index(historical_data):
+    _frame_indexes.pop(id(historical_data), None)
+
+
+# Forget every parsed file and index held by this process; the next
+# read_election_csv parses the file (or its snapshot) again
+def clear_election_cache():
+    _loaded_files.clear()
+    _frame_indexes.clear()
+
+
+# Path of the binary snapshot kept next to an election file
+def _snapshot_path(file_path):
+    directory, name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(directory, f".{name}.snapshot.pkl")
+
+
+# Frame and index of a snapshot matching the file signature; the snapshot is
+# only a speed-up, so unreadable snapshots (e.g. pickled by another pandas
+# version) give (None, None) and the CSV is parsed instead
+def _read_snapshot(snapshot_path, signature):
+    try:
+        with open(snapshot_path, "rb") as file:
+            snapshot = pickle.load(file)
+        if snapshot["signature"] == signature:
+            return snapshot["frame"], snapshot["index"]
+    except (
+        OSError,
+        EOFError,
+        KeyError,
+        TypeError,
+        AttributeError,
+        ImportError,
+        pickle.UnpicklingError,
+    ):
+        pass
+    return None, None
+
+
+# Write a snapshot next to the election file, skipping it when the directory
+# is not writable
+def _write_snapshot(snapshot_path, signature, historical_data, index):
+    try:
+        with open(snapshot_path + ".tmp", "wb") as file:
+            pickle.dump(
+                {"signature": signature, "frame": historical_data, "index": index},
+                file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(snapshot_path + ".tmp", snapshot_path)
+    except OSError:
+        if os.path.exists(snapshot_path + ".tmp"):
+            os.remove(snapshot_path + ".tmp")
+
+
+# Independent copy of a parsed file, already indexed
+def _copy_loaded(historical_data, index):
+    historical_data = historical_data.copy()
+    _store_index(historical_data, index)
+    return historical_data
+
+
+# Parse an election results CSV once, reusing a binary snapshot when the
+# file has not changed since the snapshot was written; every call returns
+# its own copy, so editing it does not affect other callers
+def read_election_csv(file_path, use_snapshot=True):
+    stat = os.stat(file_path)
+    signature = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    if signature in _loaded_files:
+        return _copy_loaded(*_loaded_files[signature])
+
+    snapshot_path = _snapshot_path(file_path)
+    historical_data = index = None
+    if use_snapshot and os.path.exists(snapshot_path):
+        historical_data, index = _read_snapshot(snapshot_path, signature)
+
+    if historical_data is None:
+        historical_data = pd.read_csv(file_path, thousands=",")
+        index = build_election_index(historical_data)
+        if use_snapshot:
+            _write_snapshot(snapshot_path, signature, historical_data, index)
+
+    _loaded_files[signature] = (historical_data, index)
+    return _copy_loaded(*_loaded_files[signature])
+
+
+# All election years in the results
+def election_years(historical_data):
+    return [int(year) for year in election_index(historical_data)["years"]]
+
+
+# One result column for every party that stood in a year, in file order
+def year_results(historical_data, year, column="Vote Share (%)"):
+    index = election_index(historical_data)
+    order = index["party_order"].get(int(year), [])
+    values = (
+        index["values"][column][index["year_index"][int(year)], order] if order else []
+    )
+    return pd.Series(
+        values,
+        index=pd.Index([index["parties"][j] for j in order], name="Party"),
+        name=column,
+    )
+
+
+# One result value for a party in a year, NaN when the party did not stand
+def lookup_result(historical_data, year, party, column="Vote Share (%)"):
+    index = election_index(historical_data)
+    i = index["year_index"].get(int(year))
+    j = index["party_index"].get(party)
+    if i is None or j is None:
+        return np.nan
+    return index["values"][column][i, j]
+
+
+# One result value for each of several parties in a year, NaN for parties
+# that did not stand
+def lookup_results(historical_data, year, parties, column="Vote Share (%)"):
+    index = election_index(historical_data)
+    i = index["year_index"].get(int(year))
+    return np.array(
+        [
+            (
+                np.nan
+                if i is None or party not in index["party_index"]
+                else index["values"][column][i, index["party_index"][party]]
+            )
+            for party in parties
+        ]
+    )
+
+
+# A result column as a year x party table
+def results_table(historical_data, column="Vote Share (%)"):
+    index = election_index(historical_data)
+    return pd.DataFrame(
+        index["values"][column],
+        index=pd.Index(index["years"], name="Year"),
+        columns=pd.Index(index["parties"], name="Party"),
+    )
@@ -0,0 +1,286 @@
+import json
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+from bangladesh_election_simulation import define_parties_and_spectrums
+
+DEFAULT_STORE_DIR = "results_store"
+
+# Columns every sub-national results file must provide
+REQUIRED_COLUMNS = ["Year", "Constituency", "Party", "Votes"]
+
+# Column types in the columnar store; labelled columns hold integer codes
+STORE_COLUMNS = {
+    "Year": np.int16,
+    "District": np.int32,
+    "Constituency": np.int32,
+    "Party": np.int16,
+    "Votes": np.int64,
+}
+LABELLED_COLUMNS = ["District", "Constituency", "Party"]
+
+# Label for parties outside the modelled parties
+OTHER_PARTY = "Others"
+
+# Common spellings and abbreviations of the modelled parties
+PARTY_ALIASES = {
+    "al": "Awami League",
+    "awami league": "Awami League",
+    "bangladesh awami league": "Awami League",
+    "bal": "Awami League",
+    "bnp": "Bangladesh Nationalist Party",
+    "bangladesh nationalist party": "Bangladesh Nationalist Party",
+    "jamaat": "Bangladesh Jamaat-e-Islami",
+    "jamaat-e-islami": "Bangladesh Jamaat-e-Islami",
+    "jamaat e islami": "Bangladesh Jamaat-e-Islami",
+    "bangladesh jamaat-e-islami": "Bangladesh Jamaat-e-Islami",
+    "bangladesh jamaat e islami": "Bangladesh Jamaat-e-Islami",
+    "jp": "Jatiya Party",
+    "jatiya party": "Jatiya Party",
+    "jatiya party ershad": "Jatiya Party",
+    "independent": "Independents",
+    "independents": "Independents",
+    "ind": "Independents",
+}
+
+
+# Canonical spelling of a party name: lower case, no brackets or extra spaces
+def _party_key(name):
+    name = re.sub(r"[()\[\].,]", " ", str(name).lower())
+    return re.sub(r"\s+", " ", name).strip()
+
+
+# Candidate keys for a raw party name: the full name, the name without its
+# bracketed part, then the bracketed part alone, as in "... Party (BNP)"
+def _party_keys(name):
+    name = str(name)
+    keys = [_party_key(name), _party_key(re.sub(r"\(.*?\)", " ", name))]
+    keys.extend(_party_key(part) for part in re.findall(r"\((.*?)\)", name))
+    return keys
+
+
+# Map raw party names onto the keys of the modelled parties
+def normalize_party_names(names, parties):
+    aliases = {_party_key(party): party for party in parties}
+    aliases.update(
+        {alias: party for alias, party in PARTY_ALIASES.items() if party in parties}
+    )
+    mapping = {}
+    for name in pd.unique(names):
+        matches = [aliases[key] for key in _party_keys(name) if key in aliases]
+        mapping[name] = matches[0] if matches else OTHER_PARTY
+    return pd.Series(names).map(mapping)
+
+
+# Split a chunk into valid rows and a count of rejected rows per reason
+def validate_chunk(chunk):
+    missing = [column for column in REQUIRED_COLUMNS if column not in chunk]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    years = pd.to_numeric(chunk["Year"], errors="coerce")
+    votes = pd.to_numeric(chunk["Votes"], errors="coerce")
+    checks = {
+        "missing values": chunk[REQUIRED_COLUMNS].isna().any(axis=1),
+        "invalid year": years.isna() | (years < 1900) | (years > 2100),
+        "invalid votes": votes.isna() | (votes < 0) | (votes % 1 != 0),
+    }
+    invalid = np.zeros(len(chunk), dtype=bool)
+    rejected = {}
+    for reason, failed in checks.items():
+        failed = failed.to_numpy() & ~invalid
+        rejected[reason] = int(failed.sum())
+        invalid |= failed
+
+    valid = chunk[~invalid].copy()
+    valid["Year"] = years[~invalid].astype(int)
+    valid["Votes"] = votes[~invalid].astype(np.int64)
+    return valid, rejected
+
+
+# Encode labels as integer codes, growing the label list as new labels appear;
+# only the distinct labels of a chunk go through the Python-level lookup
+def _encode(values, labels):
+    chunk_codes, uniques = pd.factorize(values)
+    codes = {label: code for code, label in enumerate(labels)}
+    for value in uniques:
+        if value not in codes:
+            codes[value] = len(labels)
+            labels.append(value)
+    return np.array([codes[value] for value in uniques], dtype=np.int64)[chunk_codes]
+
+
+# Stream sub-national result CSVs into a memory-mappable columnar store
+def ingest_results(
+    file_paths,
+    store_dir,
+    parties=None,
+    chunk_size=1_000_000,
+    strict=False,
+):
+    if parties is None:
+        parties, _ = define_parties_and_spectrums()
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+    os.makedirs(store_dir, exist_ok=True)
+
+    labels = {
+        "District": [],
+        "Constituency": [],
+        "Party": list(parties) + [OTHER_PARTY],
+    }
+    rejected = {}
+    num_rows = 0
+    raw_names = {}
+
+    column_files = {
+        column: open(os.path.join(store_dir, f"{column}.bin"), "wb")
+        for column in STORE_COLUMNS
+    }
+    try:
+        for file_path in file_paths:
+            for chunk in pd.read_csv(file_path, chunksize=chunk_size, thousands=","):
+                chunk, chunk_rejected = validate_chunk(chunk)
+                if strict and any(chunk_rejected.values()):
+                    raise ValueError(
+                        f"Invalid rows in {file_path}: "
+                        + ", ".join(f"{n} {r}" for r, n in chunk_rejected.items() if n)
+                    )
+                for reason, count in chunk_rejected.items():
+                    rejected[reason] = rejected.get(reason, 0) + count
+
+                party_names = normalize_party_names(chunk["Party"].to_numpy(), parties)
+                unmatched = chunk["Party"][(party_names == OTHER_PARTY).to_numpy()]
+                for name, count in unmatched.value_counts().items():
+                    raw_names[name] = raw_names.get(name, 0) + int(count)
+                if "District" not in chunk:
+                    chunk["District"] = ""
+                chunk["Party"] = party_names.to_numpy()
+
+                for column, dtype in STORE_COLUMNS.items():
+                    values = chunk[column].to_numpy()
+                    if column in LABELLED_COLUMNS:
+                        values = _encode(chunk[column].astype(str), labels[column])
+                    column_files[column].write(
+                        np.ascontiguousarray(values, dtype=dtype).tobytes()
+                    )
+                num_rows += len(chunk)
+    finally:
+        for file in column_files.values():
+            file.close()
+
+    metadata = {
+        "num_rows": num_rows,
+        "columns": {
+            column: np.dtype(dtype).str for column, dtype in STORE_COLUMNS.items()
+        },
+        "labels": labels,
+        "rejected_rows": rejected,
+        "unmatched_parties": raw_names,
+    }
+    with open(os.path.join(store_dir, "metadata.json"), "w") as file:
+        json.dump(metadata, file, indent=2)
+    return metadata
+
+
+# Open a columnar store as read-only memory maps, without loading it
+def open_results_store(store_dir):
+    with open(os.path.join(store_dir, "metadata.json")) as file:
+        metadata = json.load(file)
+    columns = {
+        column: (
+            np.memmap(
+                os.path.join(store_dir, f"{column}.bin"),
+                dtype=np.dtype(dtype),
+                mode="r",
+                shape=(metadata["num_rows"],),
+            )
+            if metadata["num_rows"]
+            else np.empty(0, dtype=np.dtype(dtype))
+        )
+        for column, dtype in metadata["columns"].items()
+    }
+    return {"columns": columns, "labels": metadata["labels"], "metadata": metadata}
+
+
+# Sum votes over the store by Year and any labelled columns, chunk by chunk
+def aggregate_votes(store, by=("Year", "Party"), chunk_size=10_000_000):
+    columns = store["columns"]
+    years = np.unique(columns["Year"]) if len(columns["Year"]) else np.array([])
+    sizes = [
+        len(years) if column == "Year" else len(store["labels"][column])
+        for column in by
+    ]
+    totals = np.zeros(int(np.prod(sizes)), dtype=np.int64)
+
+    for start in range(0, len(columns["Votes"]), chunk_size):
+        stop = start + chunk_size
+        cell = np.zeros(min(stop, len(columns["Votes"])) - start, dtype=np.int64)
+        for column, size in zip(by, sizes):
+            codes = np.asarray(columns[column][start:stop], dtype=np.int64)
+            if column == "Year":
+                codes = np.searchsorted(years, codes)
+            cell = cell * size + codes
+        totals += np.bincount(
+            cell, weights=columns["Votes"][start:stop], minlength=len(totals)
+        ).astype(np.int64)
+
+    index = pd.MultiIndex.from_product(
+        [years if column == "Year" else store["labels"][column] for column in by],
+        names=list(by),
+    )
+    return pd.Series(totals, index=index, name="Votes")
+
+
+# National results in the bangladesh_elections_data.csv layout, with seats
+# won by the plurality winner of every constituency
+def store_to_election_results(store, parties=None):
+    if parties is None:
+        parties, _ = define_parties_and_spectrums()
+    seat_votes = aggregate_votes(store, by=("Year", "Constituency", "Party"))
+    seat_votes = seat_votes[seat_votes > 0]
+    winners = seat_votes.groupby(level=["Year", "Constituency"]).idxmax()
+    seats_won = (
+        pd.Series([party for _, _, party in winners], index=winners.index)
+        .groupby(level="Year")
+        .value_counts()
+    )
+
+    national = aggregate_votes(store, by=("Year", "Party"))
+    results = national.to_frame().reset_index()
+    results["Vote Share (%)"] = (
+        results["Votes"] / results.groupby("Year")["Votes"].transform("sum") * 100
+    ).round(2)
+    results["Seats Won"] = [
+        seats_won.get((year, party), 0)
+        for year, party in zip(results["Year"], results["Party"])
+    ]
+    results = results[results["Party"].isin(list(parties))]
+    return results[results["Votes"] > 0].reset_index(drop=True)
+
+
+# Main function
+def main():
+    file_paths = sys.argv[1:]
+    if not file_paths:
+        print("Usage: python ingest_results.py RESULTS.csv [RESULTS.csv ...]")
+        return
+
+    metadata = ingest_results(file_paths, DEFAULT_STORE_DIR)
+    print(f"Ingested {metadata['num_rows']} rows into {DEFAULT_STORE_DIR}")
+    for reason, count in metadata["rejected_rows"].items():
+        if count:
+            print(f"Rejected {count} rows: {reason}")
+    for name, count in metadata["unmatched_parties"].items():
+        print(f"Counted as {OTHER_PARTY}: {name} ({count} rows)")
+
+    store = open_results_store(DEFAULT_STORE_DIR)
+    print(store_to_election_results(store))
+
+
+if __name__ == "__main__":
+    main()
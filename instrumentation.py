@@ -0,0 +1,221 @@
+import atexit
+import cProfile
+import functools
+import io
+import json
+import multiprocessing
+import os
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# ELECTION_INSTRUMENT=1 turns instrumentation on; "profile" and "memory"
+# (comma-separated) add cProfile and tracemalloc capture
+ENV_FLAG = "ELECTION_INSTRUMENT"
+# File the report is written to at exit; "-" writes it to stderr
+ENV_REPORT = "ELECTION_INSTRUMENT_REPORT"
+
+# Checked before any other work, so disabled hooks cost one attribute lookup
+_enabled = False
+_stages = {}
+_counters = {}
+_active = []
+_profiler = None
+_started = None
+
+
+# Whether instrumentation is collecting
+def enabled():
+    return _enabled
+
+
+# Start collecting stage timings and counters, optionally with cProfile and
+# tracemalloc capture
+def enable(profile=False, trace_memory=False):
+    global _enabled, _profiler, _started
+    reset()
+    _started = time.perf_counter()
+    if profile:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+
+# Stop collecting; the collected data stays available to report()
+def disable():
+    global _enabled
+    _enabled = False
+    if _profiler is not None:
+        _profiler.disable()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+# Drop everything collected so far
+def reset():
+    global _profiler
+    _stages.clear()
+    _counters.clear()
+    _active.clear()
+    _profiler = None
+
+
+# Peak resident set size of the process so far; ru_maxrss is in kilobytes on Linux
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Shared no-op context returned by stage() while disabled
+_NULL_STAGE = nullcontext()
+
+
+# Time a named stage; repeated and nested stages are aggregated by name
+def stage(name):
+    if not _enabled:
+        return _NULL_STAGE
+    return _timed_stage(name)
+
+
+@contextmanager
+def _timed_stage(name):
+    frame = {"name": name, "traced_peak": 0}
+    if tracemalloc.is_tracing():
+        # Peaks are reset per stage, so keep the enclosing stage's peak so far
+        frame["outer_peak"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+    _active.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _active.pop()
+        stats = _stages.setdefault(
+            name,
+            {"calls": 0, "seconds": 0.0, "peak_rss_mb": 0.0, "counters": {}},
+        )
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["peak_rss_mb"] = max(stats["peak_rss_mb"], _peak_rss_mb())
+        if "outer_peak" in frame:
+            peak = max(tracemalloc.get_traced_memory()[1], frame["traced_peak"])
+            stats["peak_traced_mb"] = max(
+                stats.get("peak_traced_mb", 0.0), peak / 1024**2
+            )
+            if _active:
+                _active[-1]["traced_peak"] = max(
+                    _active[-1]["traced_peak"], peak, frame["outer_peak"]
+                )
+
+
+# Run a whole function as a stage
+def instrumented(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _timed_stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# Add to a named counter, e.g. voters simulated or random numbers drawn; the
+# amount is also credited to the innermost active stage for per-stage rates
+def count(name, amount=1):
+    if not _enabled:
+        return
+    _counters[name] = _counters.get(name, 0) + amount
+    if _active:
+        stats = _stages.setdefault(
+            _active[-1]["name"],
+            {"calls": 0, "seconds": 0.0, "peak_rss_mb": 0.0, "counters": {}},
+        )
+        stats["counters"][name] = stats["counters"].get(name, 0) + amount
+
+
+# Top functions of the cProfile capture by cumulative time
+def _profile_summary(limit=25):
+    stats = pstats.Stats(_profiler, stream=io.StringIO())
+    rows = []
+    for (file_name, line, function), (
+        primitive_calls,
+        calls,
+        own_seconds,
+        cumulative_seconds,
+        _,
+    ) in stats.stats.items():
+        rows.append(
+            {
+                "function": f"{os.path.basename(file_name)}:{line}({function})",
+                "calls": calls,
+                "own_seconds": own_seconds,
+                "cumulative_seconds": cumulative_seconds,
+            }
+        )
+    rows.sort(key=lambda row: row["cumulative_seconds"], reverse=True)
+    # Building the stats stops the profiler; resume it while still collecting
+    if _enabled:
+        _profiler.enable()
+    return rows[:limit]
+
+
+# Machine-readable report of everything collected
+def report():
+    stages = {}
+    for name, stats in _stages.items():
+        stages[name] = dict(stats)
+        stages[name]["rates"] = {
+            f"{counter}_per_second": amount / stats["seconds"]
+            for counter, amount in stats["counters"].items()
+            if stats["seconds"] > 0
+        }
+    result = {
+        "enabled": _enabled,
+        "wall_seconds": time.perf_counter() - _started if _started else 0.0,
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": stages,
+        "counters": dict(_counters),
+    }
+    if tracemalloc.is_tracing():
+        result["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 1024**2
+    if _profiler is not None:
+        result["profile"] = _profile_summary()
+    return result
+
+
+# Write the report as JSON to a file, or to stderr for "-"
+def write_report(path="-"):
+    text = json.dumps(report(), indent=2)
+    if path == "-":
+        print(text, file=sys.stderr)
+    else:
+        with open(path, "w") as file:
+            file.write(text)
+
+
+# Turn instrumentation on from the environment, reporting when the run exits;
+# worker processes inherit the variable but leave reporting to the parent
+def _enable_from_environment():
+    flag = os.environ.get(ENV_FLAG, "").strip().lower()
+    if flag in ("", "0", "false", "off", "no"):
+        return
+    if multiprocessing.current_process().name != "MainProcess":
+        return
+    options = {option.strip() for option in flag.split(",")}
+    enable(
+        profile="profile" in options,
+        trace_memory=bool(options & {"memory", "tracemalloc"}),
+    )
+    atexit.register(write_report, os.environ.get(ENV_REPORT, "-"))
+
+
+_enable_from_environment()
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2
+
+from bangladesh_election_simulation import (
+    define_demographic_probabilities,
+    define_parties_and_spectrums,
+    load_data_and_constants,
+)
+from election_data import election_years, results_table
+from replicate_runner import run_replicates
+
+METRICS = ["mae", "rmse", "r2", "chi_square", "p_value", "kl", "js", "brier"]
+
+
+# Rescale shares to proportions summing to one over the parties in the mask
+def _normalize(shares, mask):
+    shares = np.where(mask, shares, 0.0)
+    totals = shares.sum(axis=-1, keepdims=True)
+    return np.divide(shares, totals, out=np.zeros_like(shares), where=totals > 0)
+
+
+# KL divergence of q from p per row, with zero-probability terms dropped
+def _kl_divergence(p, q, epsilon=1e-12):
+    return np.sum(
+        np.where(p > 0, p * np.log(np.maximum(p, epsilon) / np.maximum(q, epsilon)), 0),
+        axis=-1,
+    )
+
+
+# Score one block of replicates, shape [replicate, year, party], against the
+# actual shares, shape [year, party]; parties with NaN actual shares did not
+# stand that year and are left out
+def _score_block(simulated, actual, mask, num_parties, epsilon):
+    errors = np.where(mask, simulated - actual, 0.0)
+    actual_masked = np.where(mask, actual, 0.0)
+
+    scores = {
+        "mae": np.abs(errors).sum(axis=-1) / num_parties,
+        "rmse": np.sqrt((errors**2).sum(axis=-1) / num_parties),
+    }
+
+    actual_mean = actual_masked.sum(axis=-1, keepdims=True) / num_parties[..., None]
+    total_variation = (np.where(mask, actual - actual_mean, 0.0) ** 2).sum(axis=-1)
+    scores["r2"] = 1 - np.divide(
+        (errors**2).sum(axis=-1),
+        total_variation,
+        out=np.full(errors.shape[:-1], np.nan),
+        where=total_variation > 0,
+    )
+
+    # Pearson chi-square of the actual shares against the simulated ones,
+    # rescaled to the same total as scipy.stats.chisquare expects; epsilon
+    # keeps a party the run gave no votes in the sum, as in safe_chisquare,
+    # so it counts as a very bad fit instead of being dropped
+    expected = np.where(mask, simulated + epsilon, 0.0)
+    expected = expected * (
+        actual_masked.sum(axis=-1, keepdims=True) / expected.sum(axis=-1, keepdims=True)
+    )
+    scores["chi_square"] = np.sum(
+        np.divide(
+            (actual_masked - expected) ** 2,
+            expected,
+            out=np.zeros_like(expected),
+            where=mask,
+        ),
+        axis=-1,
+    )
+    scores["p_value"] = chi2.sf(scores["chi_square"], np.maximum(num_parties - 1, 1))
+
+    p = _normalize(actual, mask)
+    q = _normalize(simulated, mask)
+    m = (p + q) / 2
+    scores["kl"] = _kl_divergence(p, q)
+    scores["js"] = (_kl_divergence(p, m) + _kl_divergence(q, m)) / 2
+    scores["brier"] = ((q - p) ** 2).sum(axis=-1)
+    return scores
+
+
+# Score replicate vote shares against actual results in one vectorized pass.
+# simulated has shape [replicate, year, party] (or [year, party]) and actual
+# [year, party], in the same units; every metric is returned per replicate
+# and year. Replicates are scored in blocks of chunk_size to bound memory
+def score_replicates(simulated, actual, chunk_size=100_000, epsilon=1e-8):
+    simulated = np.asarray(simulated, dtype=float)
+    actual = np.asarray(actual, dtype=float)
+    squeeze = simulated.ndim == 2
+    if squeeze:
+        simulated = simulated[None]
+    if simulated.shape[1:] != actual.shape:
+        raise ValueError(
+            f"Simulated shares {simulated.shape} do not match actual shares "
+            f"{actual.shape} as [replicate, year, party]"
+        )
+
+    mask = ~np.isnan(actual)
+    num_parties = mask.sum(axis=-1).astype(float)
+    num_replicates = simulated.shape[0]
+    scores = {metric: np.empty((num_replicates, actual.shape[0])) for metric in METRICS}
+    for start in range(0, num_replicates, chunk_size):
+        block = _score_block(
+            simulated[start : start + chunk_size], actual, mask, num_parties, epsilon
+        )
+        for metric, values in block.items():
+            scores[metric][start : start + chunk_size] = values
+
+    if squeeze:
+        return {metric: values[0] for metric, values in scores.items()}
+    return scores
+
+
+# Mean and percentile bands of every metric per year
+def summarize_scores(scores, years, percentiles=(2.5, 97.5)):
+    rows = {}
+    for metric in METRICS:
+        values = scores[metric]
+        rows[(metric, "mean")] = np.nanmean(values, axis=0)
+        for percentile in percentiles:
+            rows[(metric, f"p{percentile:g}")] = np.nanpercentile(
+                values, percentile, axis=0
+            )
+    return pd.DataFrame(rows, index=pd.Index(years, name="Year"))
+
+
+# Main function
+def main():
+    historical_data, constants = load_data_and_constants()
+    parties, political_spectrums = define_parties_and_spectrums()
+    demographic_probabilities = define_demographic_probabilities()
+
+    num_replicates = 1000
+    years = election_years(historical_data)
+    simulated = np.stack(
+        [
+            run_replicates(
+                num_replicates,
+                constants["population_size"],
+                year,
+                constants,
+                parties,
+                political_spectrums,
+                demographic_probabilities,
+                historical_data,
+                seed=42,
+            )[0].to_numpy()
+            for year in years
+        ],
+        axis=1,
+    )
+    actual = results_table(historical_data).reindex(columns=list(parties)).to_numpy()
+
+    scores = score_replicates(simulated, actual)
+    print(f"Backtest Metrics over {num_replicates} replicates per year:")
+    print(summarize_scores(scores, years).round(4).T)
+
+
+if __name__ == "__main__":
+    main()
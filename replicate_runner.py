@@ -0,0 +1,292 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bangladesh_election_simulation import (
+    SAMPLING_METHODS,
+    compile_affiliation_table,
+    define_demographic_probabilities,
+    define_parties_and_spectrums,
+    load_data_and_constants,
+    simulate_counts,
+    simulate_population,
+)
+
+# Model inputs shared by every replicate in a worker process
+_worker_model = None
+
+
+# Store the model inputs once per worker process
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+# Simulate one replicate and return the vote share (%) of each party
+def _run_replicate(seed_sequence, num_simulations, year, engine, sampling, model):
+    (
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+        affiliation_table,
+    ) = model
+    rng = np.random.default_rng(seed_sequence)
+    if engine == "counts":
+        counts = simulate_counts(
+            num_simulations,
+            year,
+            constants,
+            parties,
+            political_spectrums,
+            demographic_probabilities,
+            historical_data,
+            rng=rng,
+            affiliation_table=affiliation_table,
+        )["political_affiliation"].to_numpy()
+    elif engine == "population":
+        population = simulate_population(
+            num_simulations,
+            year,
+            constants,
+            parties,
+            political_spectrums,
+            demographic_probabilities,
+            historical_data,
+            rng=rng,
+            affiliation_table=affiliation_table,
+            sampling=sampling,
+        )
+        counts = np.bincount(
+            population["political_affiliation"], minlength=len(parties)
+        )
+    else:
+        raise ValueError(f"Unknown simulation engine: {engine}")
+    return counts / num_simulations * 100
+
+
+# Simulate a batch of replicates inside a worker process
+def _run_replicate_batch(seed_sequences, num_simulations, year, engine, sampling):
+    return [
+        _run_replicate(
+            seed_sequence, num_simulations, year, engine, sampling, _worker_model
+        )
+        for seed_sequence in seed_sequences
+    ]
+
+
+# Reduce replicate vote shares to per-party mean, spread and percentile bands;
+# se is the standard error of the mean over the replicates
+def summarize_replicates(shares, percentiles=(2.5, 50, 97.5)):
+    summary = pd.DataFrame(
+        {"mean": shares.mean(axis=0), "std": shares.std(axis=0, ddof=1)}
+    )
+    summary["se"] = summary["std"] / np.sqrt(len(shares))
+    for percentile in percentiles:
+        summary[f"p{percentile:g}"] = np.percentile(shares, percentile, axis=0)
+    return summary
+
+
+# Run independent Monte Carlo replicates across a process pool; sampling picks
+# one of the variance-reduction methods of the population engine
+def run_replicates(
+    num_replicates,
+    num_simulations,
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    seed=None,
+    workers=None,
+    engine="counts",
+    percentiles=(2.5, 50, 97.5),
+    sampling="random",
+):
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError(f"Unknown sampling method: {sampling}")
+    if sampling != "random" and engine != "population":
+        raise ValueError(f"Sampling method {sampling} needs the population engine")
+    affiliation_table = compile_affiliation_table(
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+    )
+    model = (
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+        affiliation_table,
+    )
+
+    # One child stream per replicate keeps results independent of worker count
+    seed_sequences = np.random.SeedSequence(seed).spawn(num_replicates)
+
+    workers = min(workers or os.cpu_count() or 1, num_replicates)
+    if workers <= 1:
+        results = [
+            _run_replicate(
+                seed_sequence, num_simulations, year, engine, sampling, model
+            )
+            for seed_sequence in seed_sequences
+        ]
+    else:
+        batch_size = -(-num_replicates // (workers * 4))
+        batches = [
+            seed_sequences[start : start + batch_size]
+            for start in range(0, num_replicates, batch_size)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(model,)
+        ) as executor:
+            results = [
+                shares
+                for batch in executor.map(
+                    _run_replicate_batch,
+                    batches,
+                    [num_simulations] * len(batches),
+                    [year] * len(batches),
+                    [engine] * len(batches),
+                    [sampling] * len(batches),
+                )
+                for shares in batch
+            ]
+
+    shares = pd.DataFrame(
+        results,
+        index=pd.RangeIndex(num_replicates, name="replicate"),
+        columns=pd.Index(list(parties.keys()), name="party"),
+    )
+    return shares, summarize_replicates(shares, percentiles)
+
+
+# Run the same replicates for several scenarios, each a dict overriding some
+# of the model inputs, e.g. {"younger": {"constants": younger_constants}}.
+# With common random numbers every scenario reuses the same replicate seeds,
+# so the paired differences to the first scenario cancel most sampling noise;
+# this works best with the population engine, whose draws are inverse-CDF
+# lookups of the same uniforms
+def compare_scenarios(
+    scenarios,
+    num_replicates,
+    num_simulations,
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    seed=None,
+    workers=None,
+    engine="population",
+    percentiles=(2.5, 50, 97.5),
+    sampling="random",
+    common_random_numbers=True,
+):
+    seed_sequence = np.random.SeedSequence(seed)
+    if common_random_numbers:
+        seeds = [seed_sequence.entropy] * len(scenarios)
+    else:
+        seeds = seed_sequence.generate_state(len(scenarios)).tolist()
+
+    baseline = {
+        "constants": constants,
+        "parties": parties,
+        "political_spectrums": political_spectrums,
+        "demographic_probabilities": demographic_probabilities,
+        "historical_data": historical_data,
+    }
+    shares = {}
+    for (name, overrides), scenario_seed in zip(scenarios.items(), seeds):
+        model = dict(baseline, **overrides)
+        shares[name], _ = run_replicates(
+            num_replicates,
+            num_simulations,
+            year,
+            model["constants"],
+            model["parties"],
+            model["political_spectrums"],
+            model["demographic_probabilities"],
+            model["historical_data"],
+            seed=scenario_seed,
+            workers=workers,
+            engine=engine,
+            percentiles=percentiles,
+            sampling=sampling,
+        )
+
+    reference, *others = shares
+    differences = pd.concat(
+        {
+            name: summarize_replicates(shares[name] - shares[reference], percentiles)
+            for name in others
+        },
+        names=["scenario"],
+    )
+    return shares, differences
+
+
+# Main function
+def main():
+    historical_data, constants = load_data_and_constants()
+    parties, political_spectrums = define_parties_and_spectrums()
+    demographic_probabilities = define_demographic_probabilities()
+
+    year = 2001
+    num_replicates = 1000
+    shares, summary = run_replicates(
+        num_replicates,
+        constants["population_size"],
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+        seed=42,
+    )
+
+    print(
+        f"Simulated Vote Share (%) for {year} over {num_replicates} replicates "
+        f"of {constants['population_size']} voters:"
+    )
+    print(summary.round(2))
+
+    # Spread of a single run under every sampling method of the population
+    # engine; efficiency is how many times fewer voters reach the same spread
+    spreads = {}
+    for sampling in SAMPLING_METHODS:
+        _, sampling_summary = run_replicates(
+            200,
+            constants["population_size"],
+            year,
+            constants,
+            parties,
+            political_spectrums,
+            demographic_probabilities,
+            historical_data,
+            seed=42,
+            engine="population",
+            sampling=sampling,
+        )
+        spreads[sampling] = sampling_summary["std"]
+    spreads = pd.DataFrame(spreads)
+    print(
+        f"\nStandard deviation (%) of one run of {constants['population_size']} voters:"
+    )
+    print(spreads.round(3))
+    print("\nEfficiency relative to random sampling:")
+    print((spreads["random"].pow(2).mean() / spreads.pow(2).mean()).round(1))
+
+
+if __name__ == "__main__":
+    main()
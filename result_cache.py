@@ -0,0 +1,317 @@
+import hashlib
+import os
+import pickle
+import random
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from bangladesh_election_simulation import (
+    analyze_results,
+    define_categories,
+    run_simulation,
+    simulate_counts,
+    simulate_population,
+)
+from reverse_political_spectrum import infer_spectrum_distribution
+
+DEFAULT_CACHE_DIR = ".simulation_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DATA_FILE = "bangladesh_elections_data.csv"
+# Part of every cache key; bump when the simulation or analysis code changes
+# its results, so entries made by older code are no longer hit
+CACHE_VERSION = 1
+
+# Content digests of data files, keyed by path, modification time and size
+_file_digests = {}
+
+
+# Content digest of a data file, recomputed only when the file changes
+def file_digest(path):
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if memo_key not in _file_digests:
+        with open(path, "rb") as file:
+            _file_digests[memo_key] = hashlib.sha256(file.read()).hexdigest()
+    return _file_digests[memo_key]
+
+
+# Feed a value into a hash in a form that is stable across processes
+def _update_hash(hasher, value):
+    if isinstance(value, dict):
+        # Order matters: it defines the category codes of the model
+        hasher.update(b"dict")
+        for key, item in value.items():
+            _update_hash(hasher, key)
+            _update_hash(hasher, item)
+    elif isinstance(value, (list, tuple)):
+        hasher.update(type(value).__name__.encode())
+        for item in value:
+            _update_hash(hasher, item)
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        hasher.update(type(value).__name__.encode())
+        _update_hash(hasher, [str(name) for name in getattr(value, "columns", [])])
+        _update_hash(hasher, str(value.name) if isinstance(value, pd.Series) else "")
+        hasher.update(pd.util.hash_pandas_object(value, index=True).to_numpy())
+    elif isinstance(value, np.ndarray):
+        hasher.update(f"ndarray{value.dtype}{value.shape}".encode())
+        hasher.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, np.generic):
+        _update_hash(hasher, value.item())
+    elif value is None or isinstance(value, (str, int, float, bool)):
+        hasher.update(f"{type(value).__name__}:{value!r}".encode())
+    else:
+        raise TypeError(f"Cannot build a stable cache key from {type(value).__name__}")
+
+
+# Stable hash of all the inputs of a cached call
+def cache_key(*parts):
+    hasher = hashlib.sha256()
+    for part in parts:
+        _update_hash(hasher, part)
+    return hasher.hexdigest()
+
+
+# Directory holding the entries for the current content of a data file; entries
+# made from earlier versions of the same file are removed
+def _entry_dir(cache_dir, data_file):
+    digest = file_digest(data_file)
+    source = os.path.abspath(data_file)
+    entry_dir = os.path.join(cache_dir, digest[:32])
+    if not os.path.isdir(entry_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            source_path = os.path.join(cache_dir, name, "source.txt")
+            if os.path.exists(source_path):
+                with open(source_path) as file:
+                    if file.read() == source:
+                        shutil.rmtree(os.path.join(cache_dir, name))
+        os.makedirs(entry_dir)
+        with open(os.path.join(entry_dir, "source.txt"), "w") as file:
+            file.write(source)
+    return entry_dir, digest
+
+
+# Remove least recently used entries until the cache fits in max_bytes
+def _evict(cache_dir, max_bytes):
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith(".pkl"):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+
+
+# Remove every cached entry
+def clear_cache(cache_dir=DEFAULT_CACHE_DIR):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+# Call a function, or return its stored result for the same inputs
+def cached_call(
+    function,
+    *args,
+    cache_dir=DEFAULT_CACHE_DIR,
+    max_bytes=DEFAULT_MAX_BYTES,
+    data_file=DATA_FILE,
+    **kwargs,
+):
+    entry_dir, digest = _entry_dir(cache_dir, data_file)
+    key = cache_key(
+        CACHE_VERSION, function.__module__, function.__qualname__, args, kwargs, digest
+    )
+    path = os.path.join(entry_dir, f"{key}.pkl")
+
+    if os.path.exists(path):
+        with open(path, "rb") as file:
+            result = pickle.load(file)
+        # Touching the entry marks it as recently used for eviction
+        os.utime(path)
+        return result
+
+    result = function(*args, **kwargs)
+    with open(path + ".tmp", "wb") as file:
+        pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+    _evict(cache_dir, max_bytes)
+    return result
+
+
+# Per-category counts of a seeded simulation with the chosen engine
+def simulation_counts(
+    num_simulations,
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    seed,
+    engine="counts",
+):
+    args = (
+        num_simulations,
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+    )
+    if engine == "counts":
+        return simulate_counts(*args, rng=seed)
+    if engine == "population":
+        population = simulate_population(*args, rng=seed)
+        categories = define_categories(constants, parties, political_spectrums)
+        return {
+            column: pd.Series(
+                np.bincount(codes, minlength=len(categories[column])),
+                index=pd.Index(categories[column], name=column),
+                name="count",
+            )
+            for column, codes in population.items()
+        }
+    if engine == "individual":
+        # The per-voter engine draws from the global random module; seed it for
+        # this run only and hand the caller's state back afterwards
+        state = random.getstate()
+        try:
+            random.seed(seed)
+            simulated_population = run_simulation(*args)
+        finally:
+            random.setstate(state)
+        return {
+            column: simulated_population[column].value_counts(sort=False)
+            for column in simulated_population.columns
+        }
+    raise ValueError(f"Unknown simulation engine: {engine}")
+
+
+# Cached simulation aggregates; unseeded runs bypass the cache
+def cached_simulation_counts(
+    num_simulations,
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    seed,
+    engine="counts",
+    **cache_options,
+):
+    # Without a seed the run is meant to be random, so it is never cached
+    if seed is None:
+        return simulation_counts(
+            num_simulations,
+            year,
+            constants,
+            parties,
+            political_spectrums,
+            demographic_probabilities,
+            historical_data,
+            seed,
+            engine,
+        )
+    return cached_call(
+        simulation_counts,
+        num_simulations,
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+        seed,
+        engine=engine,
+        **cache_options,
+    )
+
+
+# Simulate and analyze in one step, so the pair can be cached together
+def simulation_analysis(
+    num_simulations,
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    seed,
+    engine="counts",
+):
+    counts = simulation_counts(
+        num_simulations,
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+        seed,
+        engine,
+    )
+    return analyze_results(counts, historical_data, year)
+
+
+# Cached analyze_results output for a seeded simulation; unseeded runs
+# bypass the cache
+def cached_analysis(
+    num_simulations,
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    seed,
+    engine="counts",
+    **cache_options,
+):
+    # Without a seed the run is meant to be random, so it is never cached
+    if seed is None:
+        return simulation_analysis(
+            num_simulations,
+            year,
+            constants,
+            parties,
+            political_spectrums,
+            demographic_probabilities,
+            historical_data,
+            seed,
+            engine,
+        )
+    return cached_call(
+        simulation_analysis,
+        num_simulations,
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+        seed,
+        engine=engine,
+        **cache_options,
+    )
+
+
+# Cached infer_spectrum_distribution result
+def cached_spectrum_inference(
+    actual_votes, parties_spectrum, political_spectrums, **cache_options
+):
+    return cached_call(
+        infer_spectrum_distribution,
+        actual_votes,
+        parties_spectrum,
+        political_spectrums,
+        **cache_options,
+    )
@@ -1,13 +1,21 @@
+import os
 import numpy as np
 import pandas as pd
 import random
+from concurrent.futures import ProcessPoolExecutor
 from scipy.optimize import minimize
 
+from election_data import read_election_csv, results_table, year_results
+
 
 # Load election results
 def load_election_results(file_path, year):
-    df = pd.read_csv(file_path)
-    return df[df["Year"] == year].set_index("Party")["Vote Share (%)"] / 100
+    return year_results(read_election_csv(file_path), year) / 100
+
+
+# Load election results for every year as a year x party table
+def load_all_election_results(file_path):
+    return results_table(read_election_csv(file_path)) / 100
 
 
 # Define parties and their associated political spectrums
@@ -55,27 +63,182 @@ def objective(x, actual_votes, parties_spectrum, political_spectrums):
     )
 
 
+# Party x spectrum matrix that maps a spectrum distribution to expected votes
+def build_mapping_matrix(parties, parties_spectrum, political_spectrums):
+    mapping_matrix = np.zeros((len(parties), len(political_spectrums)))
+    for i, party in enumerate(parties):
+        spectrum = parties_spectrum[party]
+        if spectrum in political_spectrums:
+            mapping_matrix[i, political_spectrums.index(spectrum)] = 1
+        elif spectrum == "Various":
+            mapping_matrix[i, :] = 1 / len(political_spectrums)
+    return mapping_matrix
+
+
+# Vectorized objective with its analytic gradient
+def vectorized_objective(x, mapping_matrix, actual_votes):
+    residual = mapping_matrix @ x - actual_votes
+    return residual @ residual, 2 * mapping_matrix.T @ residual
+
+
 # Constraint: sum of probabilities should be 1
 def constraint(x):
     return np.sum(x) - 1
 
 
-# Infer political spectrum distribution
-def infer_spectrum_distribution(actual_votes, parties_spectrum, political_spectrums):
-    initial_guess = np.ones(len(political_spectrums)) / len(political_spectrums)
-    bounds = [(0, 1) for _ in political_spectrums]
-    constraint = {"type": "eq", "fun": lambda x: np.sum(x) - 1}
+# Solve for the spectrum distribution that best explains one set of vote shares
+def _solve_spectrum_distribution(
+    mapping_matrix, actual_votes, initial_guess=None, ftol=1e-12
+):
+    num_spectrums = mapping_matrix.shape[1]
+    if initial_guess is None:
+        initial_guess = np.ones(num_spectrums) / num_spectrums
 
+    # Parties without results for this year do not contribute to the fit
+    observed = ~np.isnan(actual_votes)
     result = minimize(
-        objective,
+        vectorized_objective,
         initial_guess,
-        args=(actual_votes, parties_spectrum, political_spectrums),
+        args=(mapping_matrix[observed], actual_votes[observed]),
         method="SLSQP",
-        bounds=bounds,
-        constraints=constraint,
+        jac=True,
+        bounds=[(0, 1)] * num_spectrums,
+        constraints={
+            "type": "eq",
+            "fun": constraint,
+            "jac": lambda x: np.ones_like(x),
+        },
+        options={"ftol": ftol},
+    )
+    return result.x
+
+
+# Infer political spectrum distribution
+def infer_spectrum_distribution(
+    actual_votes, parties_spectrum, political_spectrums, initial_guess=None
+):
+    mapping_matrix = build_mapping_matrix(
+        actual_votes.index, parties_spectrum, political_spectrums
+    )
+    x = _solve_spectrum_distribution(
+        mapping_matrix, actual_votes.to_numpy(dtype=float), initial_guess
+    )
+    return dict(zip(political_spectrums, x))
+
+
+# Solve a batch of vote share rows inside a worker process
+def _solve_batch(mapping_matrix, vote_shares, initial_guess):
+    return [
+        _solve_spectrum_distribution(mapping_matrix, actual_votes, initial_guess)
+        for actual_votes in vote_shares
+    ]
+
+
+# Infer spectrum distributions for many sets of vote shares, e.g. all years
+# from load_all_election_results or bootstrap resamples of one year
+def infer_spectrum_distributions(
+    vote_shares,
+    parties_spectrum,
+    political_spectrums,
+    workers=None,
+    initial_guess=None,
+):
+    mapping_matrix = build_mapping_matrix(
+        vote_shares.columns, parties_spectrum, political_spectrums
+    )
+    rows = vote_shares.to_numpy(dtype=float)
+
+    workers = min(workers or os.cpu_count() or 1, len(rows))
+    if workers <= 1:
+        results = _solve_batch(mapping_matrix, rows, initial_guess)
+    else:
+        batch_size = -(-len(rows) // (workers * 4))
+        batches = [
+            rows[start : start + batch_size]
+            for start in range(0, len(rows), batch_size)
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = [
+                x
+                for batch in executor.map(
+                    _solve_batch,
+                    [mapping_matrix] * len(batches),
+                    batches,
+                    [initial_guess] * len(batches),
+                )
+                for x in batch
+            ]
+
+    return pd.DataFrame(
+        results,
+        index=vote_shares.index,
+        columns=pd.Index(political_spectrums, name="Spectrum"),
+    )
+
+
+# Load the votes and vote shares of every party for one year
+def load_election_votes(file_path, year):
+    historical_data = read_election_csv(file_path)
+    return pd.DataFrame(
+        {
+            "Votes": year_results(historical_data, year, "Votes"),
+            "Vote Share (%)": year_results(historical_data, year),
+        }
+    )
+
+
+# Resample vote shares with a multinomial draw over the votes cast, where
+# votes for parties outside the table form one extra "others" outcome
+def resample_vote_shares(election_votes, num_replicates, rng=None):
+    rng = np.random.default_rng(rng)
+    votes = election_votes["Votes"].to_numpy(dtype=float)
+    total_votes = votes.sum() / (election_votes["Vote Share (%)"].sum() / 100)
+    probabilities = np.append(votes, max(total_votes - votes.sum(), 0)) / total_votes
+    counts = rng.multinomial(
+        int(round(total_votes)), probabilities / probabilities.sum(), num_replicates
+    )
+    return pd.DataFrame(
+        counts[:, :-1] / total_votes,
+        index=pd.RangeIndex(num_replicates, name="replicate"),
+        columns=election_votes.index,
+    )
+
+
+# Bootstrap confidence intervals for the inferred spectrum distribution
+def bootstrap_spectrum_distribution(
+    election_votes,
+    parties_spectrum,
+    political_spectrums,
+    num_replicates=1000,
+    confidence=0.95,
+    rng=None,
+    workers=None,
+):
+    actual_votes = election_votes["Vote Share (%)"] / 100
+    point_estimate = infer_spectrum_distribution(
+        actual_votes, parties_spectrum, political_spectrums
+    )
+
+    # Every replicate starts from the point estimate, which is already close
+    replicates = infer_spectrum_distributions(
+        resample_vote_shares(election_votes, num_replicates, rng),
+        parties_spectrum,
+        political_spectrums,
+        workers=workers,
+        initial_guess=np.array(list(point_estimate.values())),
     )
 
-    return dict(zip(political_spectrums, result.x))
+    alpha = (1 - confidence) / 2
+    intervals = pd.DataFrame(
+        {
+            "estimate": pd.Series(point_estimate),
+            "std": replicates.std(axis=0),
+            "lower": replicates.quantile(alpha, axis=0),
+            "upper": replicates.quantile(1 - alpha, axis=0),
+        }
+    )
+    intervals.index.name = "Spectrum"
+    return intervals, replicates
 
 
 # Main function
@@ -107,6 +270,19 @@ def main():
             f"{party}: Actual {actual:.2%}, Expected {expected:.2%}, Difference {diff:.2%}"
         )
 
+    # Bootstrap the vote counts to put uncertainty bands on the estimate
+    intervals, _ = bootstrap_spectrum_distribution(
+        load_election_votes("bangladesh_elections_data.csv", year),
+        parties_spectrum,
+        political_spectrums,
+        rng=42,
+    )
+    print(f"\n95% Bootstrap Intervals for {year}:")
+    for spectrum, row in intervals.sort_values("estimate", ascending=False).iterrows():
+        print(
+            f"{spectrum}: {row['estimate']:.2%} [{row['lower']:.2%}, {row['upper']:.2%}]"
+        )
+
 
 if __name__ == "__main__":
     main()
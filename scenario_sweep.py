@@ -0,0 +1,255 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bangladesh_election_simulation import (
+    DEMOGRAPHIC_DISTRIBUTIONS,
+    _party_factor_arrays,
+    _spectrum_weights,
+    affiliation_cells,
+    conditional_distributions,
+    define_categories,
+    define_demographic_probabilities,
+    define_parties_and_spectrums,
+    demographic_joint_probabilities,
+    load_data_and_constants,
+)
+
+
+# Build every combination of the override values given per path, e.g.
+# {("constants", "age_distribution", "18-30"): [0.35, 0.40]}
+def scenario_grid(axes):
+    paths = list(axes)
+    return [dict(zip(paths, values)) for values in itertools.product(*axes.values())]
+
+
+# Precompute the parts of the model that no scenario changes
+def build_sweep_model(
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+):
+    categories = define_categories(constants, parties, political_spectrums)
+    base, religion_factors, education_factors, spectrum_multipliers = (
+        _party_factor_arrays(
+            year, categories, parties, demographic_probabilities, historical_data
+        )
+    )
+    arrays = {
+        column: np.array(list(constants[key].values()), dtype=float)
+        for column, key in DEMOGRAPHIC_DISTRIBUTIONS.items()
+    }
+    arrays["spectrum_weights"] = _spectrum_weights(categories, political_spectrums)
+    arrays["religion_factors"] = religion_factors
+    arrays["education_factors"] = education_factors
+    # With conditional tables the demographics are no longer independent, so
+    # every scenario shares the joint [religion, age, education] cells
+    cells = None
+    if conditional_distributions(constants):
+        cells = affiliation_cells(demographic_joint_probabilities(constants))
+    return {
+        "categories": categories,
+        "base": base,
+        "spectrum_multipliers": spectrum_multipliers,
+        "arrays": arrays,
+        "cells": cells,
+    }
+
+
+# Locate the model array and index that an override path refers to
+def _override_target(path, categories):
+    section, *keys = path
+    if section == "constants":
+        columns = {key: column for column, key in DEMOGRAPHIC_DISTRIBUTIONS.items()}
+        if len(keys) == 2 and keys[0] in columns:
+            column = columns[keys[0]]
+            if keys[1] in categories[column]:
+                return column, (categories[column].index(keys[1]),)
+    elif section == "political_spectrums":
+        if (
+            len(keys) == 2
+            and keys[0] in categories["political_spectrum"]
+            and keys[1] in categories["age_group"]
+        ):
+            return "spectrum_weights", (
+                categories["age_group"].index(keys[1]),
+                categories["political_spectrum"].index(keys[0]),
+            )
+    elif section == "demographic_probabilities":
+        if (
+            len(keys) == 3
+            and keys[0] in ["religion", "education"]
+            and keys[1] in categories["political_affiliation"]
+            and keys[2] in categories[keys[0]]
+        ):
+            return f"{keys[0]}_factors", (
+                categories["political_affiliation"].index(keys[1]),
+                categories[keys[0]].index(keys[2]),
+            )
+    raise ValueError(f"Unknown scenario override: {path}")
+
+
+# Stack the model arrays of every scenario, applying their overrides
+def _scenario_arrays(scenarios, model):
+    num_scenarios = len(scenarios)
+    arrays = {
+        name: np.repeat(array[None], num_scenarios, axis=0)
+        for name, array in model["arrays"].items()
+    }
+    overridden = {
+        column: np.zeros((num_scenarios, len(model["arrays"][column])), dtype=bool)
+        for column in DEMOGRAPHIC_DISTRIBUTIONS
+    }
+
+    for path in {path for scenario in scenarios for path in scenario}:
+        name, index = _override_target(path, model["categories"])
+        if name in overridden and model["cells"] is not None:
+            raise ValueError(
+                f"Cannot override {path} when conditional distributions are set"
+            )
+        rows = [i for i, scenario in enumerate(scenarios) if path in scenario]
+        arrays[name][(rows, *index)] = [scenarios[i][path] for i in rows]
+        if name in overridden:
+            overridden[name][(rows, *index)] = True
+
+    # Overriding one share of a distribution rescales the remaining shares,
+    # so "18-30 rises to 0.40" keeps the distribution summing to its total
+    for column, mask in overridden.items():
+        weights = arrays[column]
+        total = model["arrays"][column].sum()
+        remaining = np.clip(total - np.where(mask, weights, 0).sum(axis=1), 0, None)
+        others = np.where(mask, 0, weights).sum(axis=1)
+        scale = np.divide(remaining, others, out=np.ones_like(others), where=others > 0)
+        arrays[column] = np.where(mask, weights, weights * scale[:, None])
+
+    return arrays
+
+
+# Exact expected party shares for a batch of scenarios, shape [scenario, party]
+def _evaluate_scenarios(scenarios, model):
+    arrays = _scenario_arrays(scenarios, model)
+    spectrum_weights = arrays["spectrum_weights"]
+    spectrum_weights = spectrum_weights / spectrum_weights.sum(axis=2, keepdims=True)
+
+    table = (
+        model["base"]
+        * np.swapaxes(arrays["religion_factors"], 1, 2)[:, :, None, None, :]
+        * np.swapaxes(arrays["education_factors"], 1, 2)[:, None, :, None, :]
+        * model["spectrum_multipliers"].T[None, None, None, :, :]
+    )
+    table /= table.sum(axis=-1, keepdims=True)
+    if model["cells"] is not None:
+        return np.einsum("rae,kas,kresp->kp", model["cells"], spectrum_weights, table)
+
+    distributions = {
+        column: arrays[column] / arrays[column].sum(axis=1, keepdims=True)
+        for column in ["religion", "age_group", "education"]
+    }
+    spectrum_distribution = np.einsum(
+        "ka,kas->ks", distributions["age_group"], spectrum_weights
+    )
+    return np.einsum(
+        "kr,ke,ks,kresp->kp",
+        distributions["religion"],
+        distributions["education"],
+        spectrum_distribution,
+        table,
+    )
+
+
+# Evaluate many what-if scenarios against the exact expected-share model
+def run_scenario_sweep(
+    scenarios,
+    year,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    num_simulations=None,
+    batch_size=1024,
+    workers=1,
+):
+    model = build_sweep_model(
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+    )
+    batches = [
+        scenarios[start : start + batch_size]
+        for start in range(0, len(scenarios), batch_size)
+    ]
+
+    workers = min(workers or os.cpu_count() or 1, len(batches))
+    if workers <= 1:
+        results = [_evaluate_scenarios(batch, model) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                executor.map(_evaluate_scenarios, batches, [model] * len(batches))
+            )
+    shares = np.concatenate(results) if results else np.empty((0, len(parties)))
+
+    overrides = pd.DataFrame(
+        [{".".join(path): value for path, value in s.items()} for s in scenarios],
+        index=pd.RangeIndex(len(scenarios), name="scenario"),
+    )
+    results = pd.DataFrame(
+        shares * 100,
+        index=overrides.index,
+        columns=pd.Index(list(parties), name="Party"),
+    )
+    results = results.stack().rename("Expected Vote Share (%)").reset_index()
+    if num_simulations is not None:
+        proportions = results["Expected Vote Share (%)"] / 100
+        results["Sampling SE (%)"] = (
+            np.sqrt(proportions * (1 - proportions) / num_simulations) * 100
+        )
+    return overrides.reset_index().merge(results, on="scenario")
+
+
+# Main function
+def main():
+    historical_data, constants = load_data_and_constants()
+    parties, political_spectrums = define_parties_and_spectrums()
+    demographic_probabilities = define_demographic_probabilities()
+
+    year = 2008
+    scenarios = scenario_grid(
+        {
+            ("constants", "age_distribution", "18-30"): [0.30, 0.35, 0.40, 0.45],
+            ("constants", "urban_rural_distribution", "Urban"): [0.3743, 0.45],
+        }
+    )
+    results = run_scenario_sweep(
+        scenarios,
+        year,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+        num_simulations=constants["population_size"],
+    )
+
+    print(f"Scenario Sweep of Expected Vote Share (%) for {year}:")
+    print(
+        results.pivot_table(
+            index=list(results.columns[1:3]),
+            columns="Party",
+            values="Expected Vote Share (%)",
+        ).round(2)
+    )
+
+
+if __name__ == "__main__":
+    main()
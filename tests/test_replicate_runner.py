@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from bangladesh_election_simulation import (
+    define_demographic_probabilities,
+    define_parties_and_spectrums,
+    load_data_and_constants,
+)
+from replicate_runner import run_replicates
+
+
+@pytest.fixture(scope="module")
+def model():
+    historical_data, constants = load_data_and_constants()
+    parties, political_spectrums = define_parties_and_spectrums()
+    return (
+        constants,
+        parties,
+        political_spectrums,
+        define_demographic_probabilities(),
+        historical_data,
+    )
+
+
+# Each replicate draws from its own child seed, so the results must not
+# depend on how the replicates are spread over worker processes
+@pytest.mark.parametrize(
+    "engine, sampling",
+    [("counts", "random"), ("population", "random"), ("population", "sobol")],
+)
+def test_run_replicates_is_independent_of_worker_count(model, engine, sampling):
+    runs = [
+        run_replicates(
+            6,
+            5_000,
+            2001,
+            *model,
+            seed=42,
+            workers=workers,
+            engine=engine,
+            sampling=sampling,
+        )
+        for workers in [1, 2]
+    ]
+    pd.testing.assert_frame_equal(runs[0][0], runs[1][0])
+    pd.testing.assert_frame_equal(runs[0][1], runs[1][1])
+    # A different seed gives different replicates
+    other, _ = run_replicates(
+        6, 5_000, 2001, *model, seed=43, workers=1, engine=engine, sampling=sampling
+    )
+    assert not other.equals(runs[0][0])
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from bangladesh_election_simulation import (
+    SAMPLING_METHODS,
+    define_demographic_probabilities,
+    define_parties_and_spectrums,
+    expected_shares,
+    load_data_and_constants,
+    simulate_counts,
+    simulate_population,
+)
+
+YEAR = 2001
+NUM_SIMULATIONS = 200_000
+
+
+# Model inputs as positional arguments after the year, with independent
+# demographics or with conditional tables tying some of them together
+@pytest.fixture(scope="module", params=["independent", "conditional"])
+def model(request):
+    historical_data, constants = load_data_and_constants()
+    parties, political_spectrums = define_parties_and_spectrums()
+    if request.param == "conditional":
+        rng = np.random.default_rng(0)
+        constants["conditional_distributions"] = {
+            "education": {
+                "given": "location",
+                "table": rng.random((2, len(constants["education_distribution"]))),
+            },
+            "age_group": {
+                "given": "religion",
+                "table": rng.random((len(constants["religion_distribution"]), 4)),
+            },
+        }
+    return (
+        constants,
+        parties,
+        political_spectrums,
+        define_demographic_probabilities(),
+        historical_data,
+    )
+
+
+# Every simulated share must lie within five binomial standard errors of the
+# exact expected share; the variance-reduced methods are tighter still
+def assert_matches_expected(counts, expected):
+    for column, shares in expected.items():
+        shares = shares.to_numpy()
+        simulated = np.asarray(counts[column], dtype=float) / NUM_SIMULATIONS
+        tolerance = 5 * np.sqrt(shares * (1 - shares) / NUM_SIMULATIONS)
+        assert np.all(np.abs(simulated - shares) <= tolerance), column
+
+
+@pytest.mark.parametrize("sampling", SAMPLING_METHODS)
+def test_simulate_population_matches_expected_shares(model, sampling):
+    expected = expected_shares(YEAR, *model)
+    population = simulate_population(
+        NUM_SIMULATIONS, YEAR, *model, rng=1, sampling=sampling
+    )
+    counts = {
+        column: np.bincount(population[column], minlength=len(shares))
+        for column, shares in expected.items()
+    }
+    assert_matches_expected(counts, expected)
+
+
+def test_simulate_counts_matches_expected_shares(model):
+    expected = expected_shares(YEAR, *model)
+    counts = simulate_counts(NUM_SIMULATIONS, YEAR, *model, rng=1)
+    assert_matches_expected(
+        {column: counts[column].reindex(expected[column].index) for column in expected},
+        expected,
+    )
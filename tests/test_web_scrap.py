@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from web_scrap import (
+    PROGRESS_FILE,
+    create_session,
+    fetch_page,
+    page_filename,
+    parse_wikitables,
+    scrape_pages,
+)
+
+FIXTURE = os.path.join(
+    os.path.dirname(__file__), "fixtures", "2001_Bangladeshi_general_election.html"
+)
+ETAG = '"2001-results"'
+
+
+# A local stand-in for Wikipedia: serves the saved page with an ETag, answers
+# a matching If-None-Match with 304, and 404s every other path
+@pytest.fixture
+def server():
+    with open(FIXTURE, encoding="utf-8") as file:
+        body = file.read().encode("utf-8")
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append((self.path, self.headers.get("If-None-Match")))
+            if self.path != "/wiki/2001_Bangladeshi_general_election":
+                self.send_error(404)
+                return
+            if self.headers.get("If-None-Match") == ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield base_url, requests_seen
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_parse_wikitables_reads_saved_page():
+    with open(FIXTURE, encoding="utf-8") as file:
+        tables = parse_wikitables(file.read())
+
+    # The infobox and the empty wikitable are left out
+    assert [name for name, _ in tables] == ["Table_1", "Table_2"]
+    results = tables[0][1]
+    assert list(results.columns) == ["Party", "Votes", "%", "Seats"]
+    assert results["Party"].tolist() == [
+        "Bangladesh Nationalist Party",
+        "Awami League",
+        "Islami Jatiya\nOikya Front",
+        "Bangladesh Jamaat-e-Islami",
+        "Independents[2]",
+        "Total",
+    ]
+    assert results.loc[1, "%"] == "40.13"
+    # The short total row is padded to the width of the table
+    assert results.loc[5, "Seats"] == ""
+
+    divisions = tables[1][1]
+    assert divisions["Winner"].tolist() == ["BNP", "BNP & allies"]
+
+
+def test_fetch_page_downloads_then_revalidates(server, tmp_path):
+    base_url, requests_seen = server
+    url = f"{base_url}/wiki/2001_Bangladeshi_general_election"
+    session = create_session(retries=0)
+
+    html, status = fetch_page(session, url, cache_dir=tmp_path)
+    assert status == "downloaded"
+    assert "2001 Bangladeshi general election" in html
+
+    cached_html, status = fetch_page(session, url, cache_dir=tmp_path)
+    assert status == "not modified"
+    assert cached_html == html
+    assert requests_seen[-1][1] == ETAG
+
+
+def test_scrape_pages_resumes_and_reports_errors(server, tmp_path):
+    base_url, requests_seen = server
+    page = f"{base_url}/wiki/2001_Bangladeshi_general_election"
+    missing = f"{base_url}/wiki/Missing_election"
+    output_dir = tmp_path / "tables"
+    cache_dir = tmp_path / "cache"
+    session = create_session(retries=0)
+
+    results, errors = scrape_pages(
+        [page, missing], output_dir, cache_dir, workers=2, session=session
+    )
+    assert results == {page: "downloaded"}
+    assert list(errors) == [missing]
+    assert "404" in errors[missing]
+    with open(output_dir / PROGRESS_FILE, encoding="utf-8") as file:
+        assert json.load(file) == {page: page_filename(page)}
+    assert "Bangladesh Nationalist Party" in (
+        output_dir / page_filename(page)
+    ).read_text(encoding="utf-8")
+
+    # A rerun skips the finished page and only retries the failed one
+    del requests_seen[:]
+    results, errors = scrape_pages(
+        [page, missing], output_dir, cache_dir, workers=2, session=session
+    )
+    assert results == {page: "skipped"}
+    assert list(errors) == [missing]
+    assert [path for path, _ in requests_seen] == ["/wiki/Missing_election"]
+
+    # A refresh revalidates the cached copy instead of downloading it again
+    results, _ = scrape_pages(
+        [page], output_dir, cache_dir, refresh=True, session=session
+    )
+    assert results == {page: "not modified"}
@@ -0,0 +1,326 @@
+import numpy as np
+import pandas as pd
+
+from bangladesh_election_simulation import (
+    DEMOGRAPHIC_DISTRIBUTIONS,
+    _normalized_weights,
+    _spectrum_weights,
+    affiliation_cells,
+    compile_affiliation_table,
+    conditional_distributions,
+    define_categories,
+    define_demographic_probabilities,
+    define_parties_and_spectrums,
+    demographic_joint_probabilities,
+    load_data_and_constants,
+)
+from election_data import election_years
+
+# Width of every age bucket in years; the last bucket is open-ended
+AGE_BUCKET_YEARS = {"18-30": 13, "31-50": 20, "51-65": 15, "65+": None}
+
+# Annual probability of leaving the electorate per age bucket
+MORTALITY_RATES = {"18-30": 0.002, "31-50": 0.004, "51-65": 0.015, "65+": 0.06}
+
+
+# Election years of the trajectory: the historical ones, then a cycle every
+# cycle_years up to end_year
+def trajectory_years(historical_data, end_year=2040, cycle_years=5):
+    years = election_years(historical_data)
+    return years + list(range(years[-1] + cycle_years, end_year + 1, cycle_years))
+
+
+# Default annual spectrum transitions, one [from, to] matrix per age group:
+# a voter keeps their spectrum, or with probability drift re-draws it from
+# the age-conditioned spectrum table of their age group
+def default_transition_matrices(categories, political_spectrums, drift=0.05):
+    targets = _normalized_weights(_spectrum_weights(categories, political_spectrums))
+    num_spectrums = targets.shape[1]
+    return (1 - drift) * np.eye(num_spectrums) + drift * targets[:, None, :]
+
+
+# Weights normalized along the last axis, with empty rows spread evenly; a
+# row no voter can reach still has to be a valid multinomial
+def _conditional_probabilities(weights):
+    totals = weights.sum(axis=-1, keepdims=True)
+    return np.divide(
+        weights,
+        totals,
+        out=np.full_like(weights, 1 / weights.shape[-1]),
+        where=totals > 0,
+    )
+
+
+# Chained draw probabilities of [religion, age, education] cells: religion,
+# then age given religion, then education given religion and age
+def _cell_distributions(cells):
+    return {
+        "religion": _conditional_probabilities(cells.sum(axis=(1, 2))),
+        "age_group": _conditional_probabilities(cells.sum(axis=2)),
+        "education": _conditional_probabilities(cells),
+    }
+
+
+# Draw cell counts [replicate, religion, age, education, spectrum] for the
+# given number of voters per replicate, chaining multinomials over the cells
+def _draw_cells(rng, totals, distributions, spectrum_probabilities):
+    religion = rng.multinomial(totals, distributions["religion"])
+    age = rng.multinomial(religion, distributions["age_group"])
+    education = rng.multinomial(age, distributions["education"])
+    return rng.multinomial(education, spectrum_probabilities[None, :, None, :])
+
+
+# Advance the electorate cells by one step of the model: mortality, ageing
+# into the next bucket, spectrum transitions, then new 18-30 entrants
+def step_electorate(cells, rng, model):
+    cells = rng.binomial(cells, model["survival"][None, None, :, None, None])
+
+    # Ageing: with ages spread uniformly within a bucket, 1/width of it moves
+    # on to the next bucket every year
+    promoted = rng.binomial(cells, model["promotion"][None, None, :, None, None])
+    cells = cells - promoted
+    cells[:, :, 1:] += promoted[:, :, :-1]
+
+    # Spectrum transitions, applied to every cell at once
+    cells = rng.multinomial(cells, model["transitions"][:, None, :, :]).sum(axis=-2)
+
+    # New voters enter the youngest bucket
+    entrants = rng.poisson(model["entrant_rate"] * cells.sum(axis=(1, 2, 3, 4)))
+    cells += _draw_cells(
+        rng,
+        entrants,
+        model["entrant_distributions"],
+        model["spectrum_probabilities"],
+    )
+    return cells
+
+
+# Precompute the arrays of the trajectory model for steps of years_per_step
+# years; annual rates and transitions are compounded over the step
+def build_trajectory_model(
+    constants,
+    political_spectrums,
+    categories,
+    transition_matrices=None,
+    drift=0.05,
+    entrant_rate=0.03,
+    mortality_rates=None,
+    years_per_step=1,
+):
+    mortality_rates = mortality_rates or MORTALITY_RATES
+    ages = categories["age_group"]
+    if transition_matrices is None:
+        transition_matrices = default_transition_matrices(
+            categories, political_spectrums, drift
+        )
+    transition_matrices = np.asarray(transition_matrices, dtype=float)
+    if transition_matrices.ndim == 2:
+        transition_matrices = np.broadcast_to(
+            transition_matrices, (len(ages), *transition_matrices.shape)
+        )
+
+    promotion = np.array(
+        [
+            (
+                min(years_per_step / AGE_BUCKET_YEARS[age], 1)
+                if AGE_BUCKET_YEARS[age]
+                else 0
+            )
+            for age in ages
+        ]
+    )
+    if conditional_distributions(constants):
+        # The joint cells carry the conditional tables between the
+        # demographics; new entrants are all 18-30, so they follow the cells
+        # of that bucket
+        cells = affiliation_cells(demographic_joint_probabilities(constants))
+        entrant_cells = np.zeros_like(cells)
+        entrant_cells[:, 0] = cells[:, 0]
+        distributions = _cell_distributions(cells)
+        entrant_distributions = _cell_distributions(entrant_cells)
+    else:
+        distributions = {
+            column: _normalized_weights(
+                list(constants[DEMOGRAPHIC_DISTRIBUTIONS[column]].values())
+            )
+            for column in ["religion", "age_group", "education"]
+        }
+        entrant_distributions = {**distributions, "age_group": np.eye(len(ages))[0]}
+    return {
+        "distributions": distributions,
+        "entrant_distributions": entrant_distributions,
+        "spectrum_probabilities": _normalized_weights(
+            _spectrum_weights(categories, political_spectrums)
+        ),
+        "survival": (1 - np.array([mortality_rates[age] for age in ages]))
+        ** years_per_step,
+        "promotion": promotion,
+        "transitions": np.linalg.matrix_power(
+            _normalized_weights(transition_matrices), years_per_step
+        ),
+        "entrant_rate": entrant_rate * years_per_step,
+        "years_per_step": years_per_step,
+    }
+
+
+# Simulate the electorate from the first election year through future cycles,
+# as aggregate cell counts for every replicate; party votes are drawn at
+# every election year from the affiliation table of the latest historical
+# election up to that year
+def simulate_trajectory(
+    num_replicates,
+    num_simulations,
+    constants,
+    parties,
+    political_spectrums,
+    demographic_probabilities,
+    historical_data,
+    years=None,
+    transition_matrices=None,
+    drift=0.05,
+    entrant_rate=0.03,
+    mortality_rates=None,
+    years_per_step=1,
+    rng=None,
+):
+    rng = np.random.default_rng(rng)
+    categories = define_categories(constants, parties, political_spectrums)
+    if years is None:
+        years = trajectory_years(historical_data)
+    historical_years = election_years(historical_data)
+    model_options = (transition_matrices, drift, entrant_rate, mortality_rates)
+    models = {
+        years_per_step: build_trajectory_model(
+            constants, political_spectrums, categories, *model_options, years_per_step
+        )
+    }
+    model = models[years_per_step]
+
+    cells = _draw_cells(
+        rng,
+        np.full(num_replicates, num_simulations),
+        model["distributions"],
+        model["spectrum_probabilities"],
+    )
+
+    tables = {}
+    electorate = np.zeros((num_replicates, len(years)), dtype=np.int64)
+    age_counts = np.zeros((num_replicates, len(years), len(categories["age_group"])))
+    spectrum_counts = np.zeros(
+        (num_replicates, len(years), len(categories["political_spectrum"]))
+    )
+    party_counts = np.zeros((num_replicates, len(years), len(parties)))
+
+    current_year = years[0]
+    for i, year in enumerate(years):
+        while current_year < year:
+            # A shorter last step lands exactly on the election year
+            step = min(years_per_step, year - current_year)
+            if step not in models:
+                models[step] = build_trajectory_model(
+                    constants, political_spectrums, categories, *model_options, step
+                )
+            cells = step_electorate(cells, rng, models[step])
+            current_year += step
+
+        party_year = max(
+            [past for past in historical_years if past <= year] or historical_years[:1]
+        )
+        if party_year not in tables:
+            tables[party_year] = compile_affiliation_table(
+                party_year,
+                constants,
+                parties,
+                political_spectrums,
+                demographic_probabilities,
+                historical_data,
+            )
+        votes = rng.multinomial(cells, tables[party_year][:, None])
+
+        electorate[:, i] = cells.sum(axis=(1, 2, 3, 4))
+        age_counts[:, i] = cells.sum(axis=(1, 3, 4))
+        spectrum_counts[:, i] = cells.sum(axis=(1, 2, 3))
+        party_counts[:, i] = votes.sum(axis=(1, 2, 3, 4))
+
+    return {
+        "years": list(years),
+        "categories": categories,
+        "electorate": electorate,
+        "age_group": age_counts,
+        "political_spectrum": spectrum_counts,
+        "political_affiliation": party_counts,
+    }
+
+
+# Mean and percentile bands of the shares of every category per year, with
+# one row per year, column and category
+def summarize_trajectory(trajectory, percentiles=(2.5, 97.5)):
+    rows = []
+    for column in ["age_group", "political_spectrum", "political_affiliation"]:
+        counts = trajectory[column]
+        shares = counts / counts.sum(axis=-1, keepdims=True)
+        summary = {"mean": shares.mean(axis=0)}
+        for percentile in percentiles:
+            summary[f"p{percentile:g}"] = np.percentile(shares, percentile, axis=0)
+        for i, year in enumerate(trajectory["years"]):
+            for j, category in enumerate(trajectory["categories"][column]):
+                row = {"Year": year, "column": column, "category": category}
+                row.update({name: values[i, j] for name, values in summary.items()})
+                rows.append(row)
+    return pd.DataFrame(rows).set_index(["Year", "column", "category"])
+
+
+# Mean spectrum shares per year, in the {year: {spectrum: share}} form the
+# spectrum charts in visualization.py take
+def spectrum_trajectory(trajectory):
+    counts = trajectory["political_spectrum"]
+    shares = (counts / counts.sum(axis=-1, keepdims=True)).mean(axis=0)
+    spectrums = trajectory["categories"]["political_spectrum"]
+    return {
+        year: dict(zip(spectrums, shares[i]))
+        for i, year in enumerate(trajectory["years"])
+    }
+
+
+# Main function
+def main():
+    historical_data, constants = load_data_and_constants()
+    parties, political_spectrums = define_parties_and_spectrums()
+    demographic_probabilities = define_demographic_probabilities()
+
+    num_replicates = 200
+    num_simulations = 100_000
+    trajectory = simulate_trajectory(
+        num_replicates,
+        num_simulations,
+        constants,
+        parties,
+        political_spectrums,
+        demographic_probabilities,
+        historical_data,
+        rng=42,
+    )
+    summary = summarize_trajectory(trajectory)
+
+    print(
+        f"Electorate Trajectory over {num_replicates} replicates "
+        f"starting from {num_simulations} voters:"
+    )
+    print(
+        pd.Series(
+            trajectory["electorate"].mean(axis=0),
+            index=pd.Index(trajectory["years"], name="Year"),
+            name="Mean Electorate",
+        ).round(0)
+    )
+    for column in ["age_group", "political_spectrum", "political_affiliation"]:
+        print(f"\nMean {column} share (%) by year:")
+        print(
+            (summary.xs(column, level="column")["mean"].unstack("category") * 100)
+            .reindex(columns=trajectory["categories"][column])
+            .round(2)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,55 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from result_cache import cache_key
+from reverse_political_spectrum import (
+    calculate_expected_votes,
+    infer_spectrum_distributions,
+    load_all_election_results,
+    parties_spectrum,
+    political_spectrums,
+)
 
+DEFAULT_CHART_DIR = "charts"
+# File in the chart directory recording the input hash of every chart
+CHART_MANIFEST = ".chart_hashes.json"
+# Bump when the drawing code changes, so every chart is redrawn once
+CHART_VERSION = 1
+FIGURE_SIZE = (12, 8)
 
-def plot_spectrum_distribution(inferred_distribution, year):
+
+def _new_figure():
+    """
+    Create a figure on its own Agg canvas, outside the global pyplot state.
+    """
+    figure = Figure(figsize=FIGURE_SIZE)
+    FigureCanvasAgg(figure)
+    return figure, figure.add_subplot()
+
+
+def _save_figure(figure, output_file):
+    """
+    Write a figure to disk, creating its directory if needed.
+    """
+    directory = os.path.dirname(output_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    figure.tight_layout()
+    figure.savefig(output_file)
+
+
+def plot_spectrum_distribution(inferred_distribution, year, output_file=None):
     """
     Create a horizontal bar chart of the inferred political spectrum distribution.
     """
-    plt.figure(figsize=(12, 8))
+    figure, ax = _new_figure()
     spectrums = list(inferred_distribution.keys())
     values = list(inferred_distribution.values())
 
@@ -17,111 +58,233 @@ def plot_spectrum_distribution(inferred_distribution, year):
         *sorted(zip(spectrums, values), key=lambda x: x[1], reverse=True)
     )
 
-    plt.barh(spectrums, values)
-    plt.xlabel("Probability")
-    plt.ylabel("Political Spectrum")
-    plt.title(f"Inferred Political Spectrum Distribution for {year}")
+    ax.barh(spectrums, values)
+    ax.set_xlabel("Probability")
+    ax.set_ylabel("Political Spectrum")
+    ax.set_title(f"Inferred Political Spectrum Distribution for {year}")
 
     # Add value labels on the bars
     for i, v in enumerate(values):
-        plt.text(v, i, f"{v:.2%}", va="center")
+        ax.text(v, i, f"{v:.2%}", va="center")
 
-    plt.tight_layout()
-    plt.savefig(f"spectrum_distribution_{year}.png")
-    plt.close()
+    _save_figure(figure, output_file or f"spectrum_distribution_{year}.png")
 
 
-def plot_vote_comparison(actual_votes, expected_votes, year):
+def plot_vote_comparison(actual_votes, expected_votes, year, output_file=None):
     """
     Create a grouped bar chart comparing actual and expected vote shares.
     """
-    plt.figure(figsize=(12, 8))
+    figure, ax = _new_figure()
     parties = list(actual_votes.index)
     x = np.arange(len(parties))
     width = 0.35
 
-    plt.bar(x - width / 2, actual_votes, width, label="Actual")
-    plt.bar(
+    ax.bar(x - width / 2, actual_votes, width, label="Actual")
+    ax.bar(
         x + width / 2,
         [expected_votes.get(party, 0) for party in parties],
         width,
         label="Expected",
     )
 
-    plt.xlabel("Parties")
-    plt.ylabel("Vote Share")
-    plt.title(f"Actual vs Expected Vote Shares for {year}")
-    plt.xticks(x, parties, rotation=45, ha="right")
-    plt.legend()
+    ax.set_xlabel("Parties")
+    ax.set_ylabel("Vote Share")
+    ax.set_title(f"Actual vs Expected Vote Shares for {year}")
+    ax.set_xticks(x, parties, rotation=45, ha="right")
+    ax.legend()
 
-    plt.tight_layout()
-    plt.savefig(f"vote_comparison_{year}.png")
-    plt.close()
+    _save_figure(figure, output_file or f"vote_comparison_{year}.png")
 
 
-def plot_spectrum_trends(spectrum_data):
+def plot_spectrum_trends(spectrum_data, output_file=None):
     """
     Create a line plot showing trends in political spectrum distributions over time.
 
     spectrum_data should be a dictionary where keys are years and values are
     the inferred_distribution dictionaries for those years.
     """
-    plt.figure(figsize=(12, 8))
+    figure, ax = _new_figure()
+    years = sorted(spectrum_data)
+    spectrums = list(
+        dict.fromkeys(spectrum for data in spectrum_data.values() for spectrum in data)
+    )
 
-    for spectrum in political_spectrums:
-        values = [data[spectrum] for data in spectrum_data.values()]
-        plt.plot(spectrum_data.keys(), values, marker="o", label=spectrum)
+    for spectrum in spectrums:
+        values = [spectrum_data[year].get(spectrum, np.nan) for year in years]
+        ax.plot(years, values, marker="o", label=spectrum)
 
-    plt.xlabel("Year")
-    plt.ylabel("Probability")
-    plt.title("Political Spectrum Distribution Trends")
-    plt.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Probability")
+    ax.set_title("Political Spectrum Distribution Trends")
+    ax.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
 
-    plt.tight_layout()
-    plt.savefig("spectrum_trends.png")
-    plt.close()
+    _save_figure(figure, output_file or "spectrum_trends.png")
 
 
-def plot_heatmap(spectrum_data):
+def plot_heatmap(spectrum_data, output_file=None):
     """
     Create a heatmap showing the evolution of political spectrum distributions over time.
 
     spectrum_data should be a dictionary where keys are years and values are
     the inferred_distribution dictionaries for those years.
     """
-    df = pd.DataFrame(spectrum_data).T
+    df = pd.DataFrame(spectrum_data).T.sort_index()
+
+    figure, ax = _new_figure()
+    sns.heatmap(df, annot=True, fmt=".2%", cmap="YlOrRd", ax=ax)
+
+    ax.set_xlabel("Political Spectrum")
+    ax.set_ylabel("Year")
+    ax.set_title("Evolution of Political Spectrum Distributions")
+
+    _save_figure(figure, output_file or "spectrum_heatmap.png")
+
+
+# Chart kinds the batch renderer knows, by name
+CHART_FUNCTIONS = {
+    "spectrum_distribution": plot_spectrum_distribution,
+    "vote_comparison": plot_vote_comparison,
+    "spectrum_trends": plot_spectrum_trends,
+    "heatmap": plot_heatmap,
+}
+
+
+def build_report_results(file_path="bangladesh_elections_data.csv", workers=None):
+    """
+    Infer the spectrum distribution of every election year and collect what the
+    charts need, as {scenario: {year: {"inferred_distribution", "actual_votes",
+    "expected_votes"}}} with the historical data under the "baseline" scenario.
+    """
+    vote_shares = load_all_election_results(file_path)
+    inferred = infer_spectrum_distributions(
+        vote_shares, parties_spectrum, political_spectrums, workers=workers
+    )
+
+    years = {}
+    for year, row in inferred.iterrows():
+        inferred_distribution = row.to_dict()
+        years[int(year)] = {
+            "inferred_distribution": inferred_distribution,
+            "actual_votes": vote_shares.loc[year].dropna(),
+            "expected_votes": calculate_expected_votes(
+                inferred_distribution, parties_spectrum
+            ),
+        }
+    return {"baseline": years}
+
+
+def chart_jobs(results, output_dir=DEFAULT_CHART_DIR):
+    """
+    List every per-year and multi-year chart of a results object as
+    (kind, arguments, output file) jobs.
+    """
+    jobs = []
+    for scenario, years in results.items():
+        scenario_dir = os.path.join(output_dir, str(scenario))
+        for year, entry in years.items():
+            jobs.append(
+                (
+                    "spectrum_distribution",
+                    (entry["inferred_distribution"], year),
+                    os.path.join(scenario_dir, f"spectrum_distribution_{year}.png"),
+                )
+            )
+            jobs.append(
+                (
+                    "vote_comparison",
+                    (entry["actual_votes"], entry["expected_votes"], year),
+                    os.path.join(scenario_dir, f"vote_comparison_{year}.png"),
+                )
+            )
 
-    plt.figure(figsize=(12, 8))
-    sns.heatmap(df, annot=True, fmt=".2%", cmap="YlOrRd")
+        spectrum_data = {
+            year: entry["inferred_distribution"] for year, entry in years.items()
+        }
+        jobs.append(
+            (
+                "spectrum_trends",
+                (spectrum_data,),
+                os.path.join(scenario_dir, "spectrum_trends.png"),
+            )
+        )
+        jobs.append(
+            (
+                "heatmap",
+                (spectrum_data,),
+                os.path.join(scenario_dir, "spectrum_heatmap.png"),
+            )
+        )
+    return jobs
 
-    plt.xlabel("Political Spectrum")
-    plt.ylabel("Year")
-    plt.title("Evolution of Political Spectrum Distributions")
 
-    plt.tight_layout()
-    plt.savefig("spectrum_heatmap.png")
-    plt.close()
+def _render_job(job):
+    """
+    Draw one chart job inside a worker process.
+    """
+    kind, args, output_file = job
+    CHART_FUNCTIONS[kind](*args, output_file=output_file)
+    return output_file
+
+
+def _load_manifest(output_dir):
+    """
+    Read the input hashes of the charts drawn by earlier runs.
+    """
+    path = os.path.join(output_dir, CHART_MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def render_report(results, output_dir=DEFAULT_CHART_DIR, workers=None, force=False):
+    """
+    Render all charts of a results object across a process pool.
+
+    Each chart is keyed by a hash of its kind, inputs and CHART_VERSION; charts
+    whose hash matches the previous run and whose file still exists are
+    skipped unless force is set. Returns the rendered and skipped files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir)
+
+    pending, skipped, hashes = [], [], {}
+    for job in chart_jobs(results, output_dir):
+        kind, args, output_file = job
+        name = os.path.relpath(output_file, output_dir)
+        hashes[name] = cache_key(CHART_VERSION, kind, args)
+        if (
+            not force
+            and manifest.get(name) == hashes[name]
+            and os.path.exists(output_file)
+        ):
+            skipped.append(output_file)
+        else:
+            pending.append(job)
+
+    workers = min(workers or os.cpu_count() or 1, len(pending))
+    if workers <= 1:
+        rendered = [_render_job(job) for job in pending]
+    else:
+        chunk_size = max(1, len(pending) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rendered = list(executor.map(_render_job, pending, chunksize=chunk_size))
+
+    # Charts that are no longer produced drop out of the manifest
+    path = os.path.join(output_dir, CHART_MANIFEST)
+    with open(path + ".tmp", "w") as file:
+        json.dump(hashes, file, indent=2)
+    os.replace(path + ".tmp", path)
+    return rendered, skipped
 
 
-# Add these function calls in your main function
 def main():
-    # ... (your existing code)
-
-    # Single year visualizations
-    plot_spectrum_distribution(inferred_distribution, year)
-    plot_vote_comparison(actual_votes, expected_votes, year)
-
-    # Multi-year visualizations (you'll need to run your analysis for multiple years first)
-    spectrum_data = {
-        2008: inferred_distribution,
-        # Add more years here
-        # 2012: inferred_distribution_2012,
-        # 2016: inferred_distribution_2016,
-        # etc.
-    }
-
-    plot_spectrum_trends(spectrum_data)
-    plot_heatmap(spectrum_data)
+    results = build_report_results()
+    rendered, skipped = render_report(results)
+    print(
+        f"Rendered {len(rendered)} charts and skipped {len(skipped)} unchanged "
+        f"charts in {DEFAULT_CHART_DIR}"
+    )
 
 
 if __name__ == "__main__":
@@ -1,53 +1,201 @@
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
 import csv
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
 
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def scrape_wikipedia_tables(url):
-    # Fetch the webpage
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, "html.parser")
+DEFAULT_CACHE_DIR = ".scrape_cache"
+DEFAULT_OUTPUT_DIR = "scraped_tables"
+PROGRESS_FILE = "progress.json"
 
-    # Find all tables in the page
-    tables = soup.find_all("table", {"class": "wikitable"})
+# Wikipedia pages of the general elections in the historical data
+ELECTION_PAGES = [
+    "https://en.m.wikipedia.org/wiki/Politics_of_Bangladesh",
+    "https://en.m.wikipedia.org/wiki/1991_Bangladeshi_general_election",
+    "https://en.m.wikipedia.org/wiki/February_1996_Bangladeshi_general_election",
+    "https://en.m.wikipedia.org/wiki/June_1996_Bangladeshi_general_election",
+    "https://en.m.wikipedia.org/wiki/2001_Bangladeshi_general_election",
+    "https://en.m.wikipedia.org/wiki/2008_Bangladeshi_general_election",
+    "https://en.m.wikipedia.org/wiki/2014_Bangladeshi_general_election",
+    "https://en.m.wikipedia.org/wiki/2018_Bangladeshi_general_election",
+    "https://en.m.wikipedia.org/wiki/2024_Bangladeshi_general_election",
+]
 
-    all_data = []
 
-    for i, table in enumerate(tables):
-        # Extract all cells (th and td) from the table
-        rows = table.find_all("tr")
-        table_data = []
+# A session with pooled keep-alive connections that retries transient errors
+def create_session(pool_size=8, retries=3, backoff_factor=0.5):
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = "bangladesh-election-simulation/1.0"
+    return session
 
-        for row in rows:
-            cells = row.find_all(["th", "td"])
-            row_data = [cell.text.strip() for cell in cells]
-            if row_data:
-                table_data.append(row_data)
 
-        # Find the maximum number of columns
-        max_cols = max(len(row) for row in table_data)
+# Paths of the cached body and validators of a URL
+def _cache_paths(cache_dir, url):
+    key = hashlib.sha256(url.encode()).hexdigest()
+    return os.path.join(cache_dir, f"{key}.html"), os.path.join(
+        cache_dir, f"{key}.json"
+    )
 
-        # Pad rows with empty strings if necessary
-        padded_data = [row + [""] * (max_cols - len(row)) for row in table_data]
 
-        # Create DataFrame
-        df = pd.DataFrame(padded_data)
+# Write a file atomically, so an interrupted run never leaves half an entry
+def _write_atomic(path, text):
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(path + ".tmp", path)
+
+
+# Fetch a page, revalidating a cached copy with ETag/Last-Modified so an
+# unchanged page costs a 304 instead of a full download
+def fetch_page(session, url, cache_dir=DEFAULT_CACHE_DIR, timeout=30):
+    os.makedirs(cache_dir, exist_ok=True)
+    body_path, meta_path = _cache_paths(cache_dir, url)
+
+    headers = {}
+    meta = None
+    if os.path.exists(body_path) and os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as file:
+            meta = json.load(file)
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = session.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and meta is not None:
+        with open(body_path, encoding="utf-8") as file:
+            return file.read(), "not modified"
+    response.raise_for_status()
+
+    _write_atomic(body_path, response.text)
+    _write_atomic(
+        meta_path,
+        json.dumps(
+            {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+        ),
+    )
+    return response.text, "downloaded"
+
+
+# Single-pass parser that only collects the cells of wikitable tables,
+# without building a document tree
+class _WikitableParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tables = []
+        # One entry per open <table>: its rows (None for non-wikitables) and
+        # the row and cell of the enclosing table to resume afterwards
+        self._open_tables = []
+        self._row = None
+        self._cell = None
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            classes = (dict(attrs).get("class") or "").split()
+            if "wikitable" in classes:
+                # Registered on opening, so tables keep their document order
+                self.tables.append([])
+                self._open_tables.append((self.tables[-1], self._row, self._cell))
+                self._row = self._cell = None
+            else:
+                # Text of other nested tables stays part of the enclosing cell
+                self._open_tables.append((None, self._row, self._cell))
+        elif tag in ("style", "script"):
+            self._skip += 1
+        elif not self._open_tables or self._open_tables[-1][0] is None:
+            return
+        elif tag == "tr":
+            self._close_row()
+            self._row = []
+        elif tag in ("th", "td") and self._row is not None:
+            self._close_cell()
+            self._cell = []
+        elif tag == "br" and self._cell is not None:
+            self._cell.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "table" and self._open_tables:
+            if self._open_tables[-1][0] is not None:
+                self._close_row()
+            rows, row, cell = self._open_tables.pop()
+            if rows is not None:
+                self._row, self._cell = row, cell
+        elif tag in ("style", "script"):
+            self._skip = max(self._skip - 1, 0)
+        elif not self._open_tables or self._open_tables[-1][0] is None:
+            return
+        elif tag == "tr":
+            self._close_row()
+        elif tag in ("th", "td"):
+            self._close_cell()
+
+    def handle_data(self, data):
+        if self._cell is not None and not self._skip:
+            self._cell.append(data)
+
+    def _close_cell(self):
+        if self._cell is not None:
+            self._row.append("".join(self._cell).strip())
+            self._cell = None
 
-        # If the first row seems to be a header, use it as column names
-        if df.iloc[0].notna().all():
-            df.columns = df.iloc[0]
-            df = df[1:]
+    def _close_row(self):
+        self._close_cell()
+        if self._row:
+            self._open_tables[-1][0].append(self._row)
+        self._row = None
 
-        # Reset index
-        df = df.reset_index(drop=True)
 
-        # Add to the list of all data
+# Parse every wikitable of a page into (name, DataFrame) pairs
+def parse_wikitables(html):
+    parser = _WikitableParser()
+    parser.feed(html)
+    parser.close()
+
+    all_data = []
+    for i, table_data in enumerate(parser.tables):
+        if not table_data:
+            continue
+
+        # Pad rows with empty strings up to the widest row
+        max_cols = max(len(row) for row in table_data)
+        padded_data = [row + [""] * (max_cols - len(row)) for row in table_data]
+
+        # The first row holds the column names
+        df = pd.DataFrame(padded_data[1:], columns=padded_data[0])
         all_data.append((f"Table_{i+1}", df))
 
     return all_data
 
 
+# Fetch one page and parse its wikitables
+def scrape_wikipedia_tables(url, session=None, cache_dir=DEFAULT_CACHE_DIR):
+    session = session or create_session()
+    html, _ = fetch_page(session, url, cache_dir)
+    return parse_wikitables(html)
+
+
 def save_to_csv(data, filename):
     with open(filename, "w", newline="", encoding="utf-8") as file:
         writer = csv.writer(file)
@@ -57,11 +205,75 @@ def save_to_csv(data, filename):
             writer.writerow([])  # Empty row between tables
 
 
-# Example usage
-url = "https://en.m.wikipedia.org/wiki/Politics_of_Bangladesh"
-output_file = "wikipedia_tables.csv"
+# Output file name of a page, from the last part of its URL
+def page_filename(url):
+    name = re.sub(r"[^A-Za-z0-9_-]+", "_", url.rstrip("/").rsplit("/", 1)[-1])
+    return f"{name}.csv"
+
+
+# Scrape a page to its CSV file
+def _scrape_page(session, url, output_dir, cache_dir):
+    html, status = fetch_page(session, url, cache_dir)
+    output_file = os.path.join(output_dir, page_filename(url))
+    save_to_csv(parse_wikitables(html), output_file)
+    return output_file, status
+
+
+# Scrape many pages concurrently; pages recorded in the progress file are
+# skipped, so an interrupted run resumes where it stopped. With refresh=True
+# every page is revalidated, which only re-downloads pages that changed
+def scrape_pages(
+    urls,
+    output_dir=DEFAULT_OUTPUT_DIR,
+    cache_dir=DEFAULT_CACHE_DIR,
+    workers=8,
+    refresh=False,
+    session=None,
+):
+    os.makedirs(output_dir, exist_ok=True)
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    progress = {}
+    if not refresh and os.path.exists(progress_path):
+        with open(progress_path, encoding="utf-8") as file:
+            progress = json.load(file)
+
+    pending = [
+        url
+        for url in dict.fromkeys(urls)
+        if url not in progress
+        or not os.path.exists(os.path.join(output_dir, progress[url]))
+    ]
+    session = session or create_session(pool_size=workers)
+    results = {url: "skipped" for url in urls if url not in pending}
+    errors = {}
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {
+            executor.submit(_scrape_page, session, url, output_dir, cache_dir): url
+            for url in pending
+        }
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                output_file, results[url] = future.result()
+            except requests.RequestException as error:
+                errors[url] = str(error)
+                continue
+            progress[url] = os.path.basename(output_file)
+            _write_atomic(progress_path, json.dumps(progress, indent=2))
+
+    return results, errors
+
+
+# Main function
+def main():
+    results, errors = scrape_pages(ELECTION_PAGES)
+    for url, status in results.items():
+        print(f"{status}: {url}")
+    for url, error in errors.items():
+        print(f"failed: {url} ({error})")
+    print(f"Tables have been scraped and saved to {DEFAULT_OUTPUT_DIR}")
 
-scraped_data = scrape_wikipedia_tables(url)
-save_to_csv(scraped_data, output_file)
 
-print(f"Tables have been scraped and saved to {output_file}")
+if __name__ == "__main__":
+    main()